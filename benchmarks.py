@@ -0,0 +1,356 @@
+'''
+Benchmarks for the board engines, the solvers, and whole games, across board sizes
+and numbers of colors. Every benchmark starts from a board built with a fixed seed,
+so two runs time exactly the same work.
+
+Run this file from the command line to time everything and save the results, then
+compare a later run against them to catch regressions, e.g.
+    python3 benchmarks.py --out baseline.json
+    python3 benchmarks.py --baseline baseline.json --out latest.json
+
+The whole grid takes a while, mostly for the empirical solver on large boards with
+few colors, so --sizes, --colors, and --benchmarks can be used to time less.
+'''
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import statistics
+
+from runner import ENGINES, game
+from solvers import brute_force, empirical
+
+
+# The colors used for boards with up to 8 colors
+PALETTE = ["r", "g", "b", "y", "o", "p", "c", "w"]
+
+# The default grid of board sizes and numbers of colors
+SIZES = [5, 10, 20, 30]
+COLORS = [3, 4, 6, 8]
+
+# The loop counts at which to time the empirical solver
+LOOPS = [1, 5, 20]
+
+
+def init(engine, size, colors, seed):
+    '''
+    Times building and settling a new board
+
+    Inputs:
+        engine (str): the board engine to use - one of ENGINES
+        size (int): a dimension of the square board
+        colors (list of strings): the colors with which to populate the board
+        seed (int): the seed of the board's random number generator
+
+    Returns:
+        run (function): a function that does the work to be timed
+    '''
+    return lambda: ENGINES[engine](size=size, colors=colors, rng=random.Random(seed))
+
+
+def match(engine, size, colors, seed):
+    '''
+    Times making the first legal swap on a new board, which clears its matches and
+    any cascades they cause
+
+    Inputs:
+        engine (str): the board engine to use - one of ENGINES
+        size (int): a dimension of the square board
+        colors (list of strings): the colors with which to populate the board
+        seed (int): the seed of the board's random number generator
+
+    Returns:
+        run (function): a function that does the work to be timed
+    '''
+    board = ENGINES[engine](size=size, colors=colors, rng=random.Random(seed))
+    pair = board.legal_moves()[0]
+
+    # Time each swap on the same board with the same refills, putting it back afterwards
+    def run():
+        board.rng = random.Random(seed)
+        snapshot = board.apply_swap(pair[0], pair[1])
+        board.undo(snapshot)
+    return run
+
+
+def matches_exist(engine, size, colors, seed):
+    '''
+    Times checking a new board for possible matches
+
+    Inputs:
+        engine (str): the board engine to use - one of ENGINES
+        size (int): a dimension of the square board
+        colors (list of strings): the colors with which to populate the board
+        seed (int): the seed of the board's random number generator
+
+    Returns:
+        run (function): a function that does the work to be timed
+    '''
+    board = ENGINES[engine](size=size, colors=colors, rng=random.Random(seed))
+    return board.matches_exist
+
+
+def shuffle(engine, size, colors, seed):
+    '''
+    Times shuffling a board and clearing the matches that show up
+
+    Inputs:
+        engine (str): the board engine to use - one of ENGINES
+        size (int): a dimension of the square board
+        colors (list of strings): the colors with which to populate the board
+        seed (int): the seed of the board's random number generator
+
+    Returns:
+        run (function): a function that does the work to be timed
+    '''
+    board = ENGINES[engine](size=size, colors=colors, rng=random.Random(seed))
+    return board.shuffle
+
+
+def brute(engine, size, colors, seed):
+    '''
+    Times the brute force solver on a new board, scoring every swap
+
+    Inputs:
+        engine (str): the board engine to use - one of ENGINES
+        size (int): a dimension of the square board
+        colors (list of strings): the colors with which to populate the board
+        seed (int): the seed of the board's random number generator
+
+    Returns:
+        run (function): a function that does the work to be timed
+    '''
+    board = ENGINES[engine](size=size, colors=colors, rng=random.Random(seed))
+
+    # Forget the scores kept by the last run, so every run scores the whole board
+    def run():
+        if hasattr(board, "index"):
+            board.index = None
+        brute_force(board)
+    return run
+
+
+def brute_turn(engine, size, colors, seed):
+    '''
+    Times the brute force solver after a swap, as on every turn of a game. Boards that
+    keep scores from the last call only score again what the swap changed
+
+    Inputs:
+        engine (str): the board engine to use - one of ENGINES
+        size (int): a dimension of the square board
+        colors (list of strings): the colors with which to populate the board
+        seed (int): the seed of the board's random number generator
+
+    Returns:
+        run (function): a function that does the work to be timed
+    '''
+    board = ENGINES[engine](size=size, colors=colors, rng=random.Random(seed))
+    pair = board.legal_moves()[0]
+    brute_force(board)
+
+    # Make the same swap with the same refills every run, putting it back afterwards
+    def run():
+        board.rng = random.Random(seed)
+        journal = board.apply_swap(pair[0], pair[1])
+        brute_force(board)
+        board.undo(journal)
+    return run
+
+
+def rollouts(loops):
+    '''
+    Builds a benchmark that times the empirical solver with the given number of loops
+
+    Inputs:
+        loops (int): the number of loops for the solver
+
+    Returns:
+        benchmark (function): the benchmark
+    '''
+    def benchmark(engine, size, colors, seed):
+        board = ENGINES[engine](size=size, colors=colors, rng=random.Random(seed))
+
+        # The solver gets its own generator so that every run sees the same refills
+        return lambda: empirical(board, loops, rng=random.Random(seed))
+    return benchmark
+
+
+def full_game(engine, size, colors, seed):
+    '''
+    Times a whole game with the brute force solver
+
+    Inputs:
+        engine (str): the board engine to use - one of ENGINES
+        size (int): a dimension of the square board
+        colors (list of strings): the colors with which to populate the board
+        seed (int): the seed of the game
+
+    Returns:
+        run (function): a function that does the work to be timed
+    '''
+    return lambda: game(turns=10, solver="brute force", size=size, colors=colors, seed=seed,
+                        engine=engine)
+
+
+# Every benchmark by name, in the order they are run
+BENCHMARKS = {
+    "init": init,
+    "match": match,
+    "matches_exist": matches_exist,
+    "shuffle": shuffle,
+    "brute_force": brute,
+    "brute_force_turn": brute_turn,
+}
+for loops in LOOPS:
+    BENCHMARKS["empirical-" + str(loops)] = rollouts(loops)
+BENCHMARKS["game"] = full_game
+
+
+def measure(run, min_time=0.2, min_runs=1, max_runs=1000):
+    '''
+    Times a function, repeating it until enough time has passed. Slow benchmarks, like
+    the empirical solver on the largest boards, are only run once
+
+    Inputs:
+        run (function): the function to time
+        min_time (float, optional): the least total time in seconds to spend
+        min_runs (int, optional): the least number of times to run the function
+        max_runs (int, optional): the most number of times to run the function
+
+    Returns:
+        times (list of floats): the time of every run in seconds
+    '''
+    times = []
+    while len(times) < min_runs or (sum(times) < min_time and len(times) < max_runs):
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def suite(engine="framework", sizes=SIZES, colors=COLORS, benchmarks=None, seed=0, min_time=0.2):
+    '''
+    Runs every benchmark at every board size and number of colors
+
+    Inputs:
+        engine (str, optional): the board engine to use - one of ENGINES
+        sizes (list of ints, optional): the board sizes to time
+        colors (list of ints, optional): the numbers of colors to time, up to 8
+        benchmarks (list of strings, optional): the benchmarks to run. Defaults to all
+        seed (int, optional): the seed of every board
+        min_time (float, optional): the least time in seconds to spend on each benchmark
+
+    Yields:
+        result (dict): the benchmark, its parameters, and its timings in seconds
+    '''
+    for name in benchmarks or BENCHMARKS:
+        for size in sizes:
+            for count in colors:
+                run = BENCHMARKS[name](engine, size, PALETTE[:count], seed)
+                times = measure(run, min_time=min_time)
+
+                yield {
+                    "benchmark": name,
+                    "engine": engine,
+                    "size": size,
+                    "colors": count,
+                    "runs": len(times),
+                    "median": statistics.median(times),
+                    "min": min(times),
+
+                    # The median time for each item on the board, which stays level when
+                    # the work grows in proportion to the board
+                    "per_cell": statistics.median(times) / (size * size),
+                }
+
+
+def compare(results, baseline, tolerance=0.25):
+    '''
+    Finds the benchmarks that got slower than in a baseline run. The median times are
+    compared, and benchmarks missing from the baseline are skipped
+
+    Inputs:
+        results (list of dicts): the results of suite()
+        baseline (list of dicts): the results of an earlier run
+        tolerance (float, optional): how much slower, as a fraction, a benchmark can get
+            before it counts as a regression
+
+    Returns:
+        regressions (list of dicts): each slower benchmark with its ratio to the baseline
+    '''
+    def key(result):
+        return (result["benchmark"], result["engine"], result["size"], result["colors"])
+
+    before = {key(result): result for result in baseline}
+
+    regressions = []
+    for result in results:
+        if key(result) not in before:
+            continue
+
+        ratio = result["median"] / before[key(result)]["median"]
+        if ratio > 1 + tolerance:
+            regressions.append(dict(result, baseline=before[key(result)]["median"], ratio=ratio))
+
+    return regressions
+
+
+def main(argv=None):
+    '''
+    Parse the command line, run the benchmarks, save the results, and compare them to
+    a baseline. Exits with status 1 if any benchmark regressed
+
+    Inputs:
+        argv (list of strings, optional): the command line arguments. Defaults to sys.argv
+
+    Returns:
+        None
+    '''
+    parser = argparse.ArgumentParser(description="Time the board engines and solvers")
+    parser.add_argument("--engine", choices=sorted(ENGINES), default="framework")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    parser.add_argument("--colors", type=int, nargs="+", default=COLORS,
+                        help="numbers of colors, from 3 to 8")
+    parser.add_argument("--benchmarks", nargs="+", choices=list(BENCHMARKS), default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--min-time", type=float, default=0.2,
+                        help="least time in seconds to spend on each benchmark")
+    parser.add_argument("--out", default=None, help="file to save the results to")
+    parser.add_argument("--baseline", default=None, help="results of an earlier run to compare to")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="fraction by which a benchmark can slow down before it is flagged")
+    args = parser.parse_args(argv)
+
+    # Print each result as it finishes, since the larger boards are slow
+    results = []
+    for result in suite(args.engine, args.sizes, args.colors, args.benchmarks, args.seed, args.min_time):
+        results.append(result)
+        print("{benchmark:>14} {size:>3}x{size:<3} {colors} colors: {median:.6f} s "
+              "({per_cell:.2e} s per cell)".format(**result),
+              file=sys.stderr)
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "seed": args.seed,
+                "results": results,
+            }, f, indent=1)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f)["results"], args.tolerance)
+
+        for result in regressions:
+            print("REGRESSION {benchmark} {size}x{size} {colors} colors: {median:.6f} s "
+                  "(baseline {baseline:.6f} s, {ratio:.2f}x)".format(**result), file=sys.stderr)
+
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
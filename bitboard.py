@@ -0,0 +1,522 @@
+'''
+A bitboard version of the board from framework.py, meant for the classic boards
+of about 10x10 or smaller with a handful of colors. Each color is stored as one
+integer whose bits mark where that color is, so finding groups, letting pieces
+fall, and finding possible moves take a few whole-board integer operations per
+color instead of a loop over every item. It needs nothing beyond the standard
+library, which keeps it light enough for worker processes.
+
+The Board class here has the same interface as framework.Board, so it can be
+used by the solvers and simulations in place of the list-based version.
+'''
+
+import random
+
+
+class Board:
+    '''
+    A board stored as one bitmask per color. The item at (i, j) is bit
+    i * self.stride + j, so each column is a run of bits:
+     → i
+    ↓
+    j
+    (indexed starting at 0)
+
+    Every column is followed by two guard bits that are never set, so shifting a
+    mask by one or two bits within a column can never reach the next column.
+
+    After initializing, boards can swap items and check for matches
+    '''
+    def __init__(self, size=5, colors=["r", "g", "b", "y"], rng=None, width=None, height=None,
+                 grid=None):
+        '''
+        Initialize the board by randomly populating it and then clearing any matches
+        that may appear
+
+        Inputs:
+            size (int, optional): a dimension of the square board
+            colors (list of strings, optional): the colors with which to populate the board
+            rng (random.Random, optional): the random number generator for populating,
+                refilling, and shuffling the board. Defaults to the random module
+            width (int, optional): the number of columns, for boards that are not square.
+                Defaults to size
+            height (int, optional): the number of rows, for boards that are not square.
+                Defaults to size
+            grid (list of lists, optional): a starting grid of colors to copy instead of
+                populating the board randomly
+
+        Returns:
+            None
+        '''
+        # Initialize parameters
+        self.width = width if width is not None else size
+        self.height = height if height is not None else size
+        self.size = self.width if self.width == self.height else None
+        self.colors = colors
+        self.score = 0
+        self.rng = rng if rng is not None else random
+
+        # Masks for the layout of the bits
+        self.stride = self.height + 2
+        self.column = (1 << self.height) - 1
+        self.full = sum(self.column << (i * self.stride) for i in range(self.width))
+
+        # Populate the board randomly, unless a starting grid is given
+        if grid is None:
+            grid = [[self.rng.choice(colors) for j in range(self.height)] for i in range(self.width)]
+        self.fill(grid)
+
+        # Clear matches and reset the score
+        self.match()
+        self.score = 0
+
+        # If no matches exist, shuffle until they do
+        while not self.matches_exist():
+            self.shuffle()
+            self.score = 0
+
+    def __repr__(self):
+        '''
+        A string representation of the board which outputs it as a grid with the current score
+
+        Inputs:
+            None
+
+        Returns:
+            None
+        '''
+        grid = self.grid
+        for i in range(self.height):
+            row = ""
+            for j in range(self.width):
+                row += str(grid[j][i]) + " "
+            print(row)
+        return "Score: " + str(self.score)
+
+    @property
+    def grid(self):
+        '''
+        The board as a 2D list of nested lists of colors, in the same layout as
+        framework.Board. Changing the list does not change the board
+
+        Inputs:
+            None
+
+        Returns:
+            grid (list of lists): grid[i][j] is the color at (i, j)
+        '''
+        grid = [[None] * self.height for i in range(self.width)]
+        for color, mask in zip(self.colors, self.masks):
+            for bit in bits(mask):
+                grid[bit // self.stride][bit % self.stride] = color
+        return grid
+
+    @property
+    def hash(self):
+        '''
+        A hash of the board, equal for boards with the same items in the same places
+
+        Inputs:
+            None
+
+        Returns:
+            value (int): the hash of the masks
+        '''
+        return hash(tuple(self.masks))
+
+    def fill(self, grid):
+        '''
+        Set the masks from a 2D list of colors
+
+        Inputs:
+            grid (list of lists): grid[i][j] is the color to put at (i, j)
+
+        Returns:
+            None
+        '''
+        index = {color: k for k, color in enumerate(self.colors)}
+
+        self.masks = [0] * len(self.colors)
+        for i in range(self.width):
+            for j in range(self.height):
+                self.masks[index[grid[i][j]]] |= 1 << (i * self.stride + j)
+
+    def find(self):
+        '''
+        Scores every group on the board. Each group is worth 2 * length - 5 points, and
+        each item shared by a vertical and a horizontal group is worth 2 more
+
+        Inputs:
+            None
+
+        Returns:
+            points (int): the score of every group on the board
+            cleared (int): a mask of the items to remove
+        '''
+        s = self.stride
+        points = 0
+        cleared = 0
+
+        for m in self.masks:
+            # Items that start three in a row, then every item in a group
+            down = m & (m >> 1) & (m >> 2)
+            across = m & (m >> s) & (m >> 2 * s)
+            if not down and not across:
+                continue
+
+            vertical = down | (down << 1) | (down << 2)
+            horizontal = across | (across << s) | (across << 2 * s)
+
+            # A group starts at an item whose neighbor before it is not in the group
+            groups = (vertical & ~(vertical << 1)).bit_count() + (horizontal & ~(horizontal << s)).bit_count()
+
+            points += (2 * vertical.bit_count() + 2 * horizontal.bit_count() - 5 * groups
+                       + 2 * (vertical & horizontal).bit_count())
+            cleared |= vertical | horizontal
+
+        return points, cleared
+
+    def collapse(self, cleared):
+        '''
+        Removes the cleared items, lets the remaining items in each column fall,
+        and refills the columns from the top with random pieces
+
+        Inputs:
+            cleared (int): a mask of the items to remove
+
+        Returns:
+            None
+        '''
+        for i in range(self.width):
+            offset = i * self.stride
+            gone = (cleared >> offset) & self.column
+            if not gone:
+                continue
+
+            # Shift the items above each cleared item down by one, working from the top
+            # so that the positions of the cleared items below are not disturbed
+            for k, m in enumerate(self.masks):
+                col = (m >> offset) & self.column
+                for j in bits(gone):
+                    below = col & ~((2 << j) - 1)
+                    above = col & ((1 << j) - 1)
+                    col = below | (above << 1)
+                self.masks[k] = (m & ~(self.column << offset)) | (col << offset)
+
+            # Refill the emptied items at the top of the column
+            for j in range(gone.bit_count()):
+                k = self.rng.randrange(len(self.colors))
+                self.masks[k] |= 1 << (offset + j)
+
+    def match(self):
+        '''
+        Finds every group on the board, scores them, and refills the board until
+        no groups remain
+
+        Inputs:
+            None
+
+        Returns:
+            None
+        '''
+        # Run until all matches are cleared because more might show up as the pieces shift
+        while True:
+            points, cleared = self.find()
+
+            # Stop the loop if no matches were found
+            if not cleared:
+                break
+
+            self.score += points
+            self.collapse(cleared)
+
+    def match_no_replacement(self):
+        '''
+        The same as the match function, but does not clear or refill the board in
+        order to facilitate the solver functions
+
+        Inputs:
+            None
+
+        Returns:
+            None
+        '''
+        self.score += self.find()[0]
+
+    def exchange(self, pos1, pos2):
+        '''
+        Swap two items without checking for matches
+
+        Inputs:
+            pos1 (tuple): the coordinate of the first item to swap
+            pos2 (tuple): the coordinate of the second item to swap
+
+        Returns:
+            None
+        '''
+        bit1 = 1 << (pos1[0] * self.stride + pos1[1])
+        bit2 = 1 << (pos2[0] * self.stride + pos2[1])
+
+        # Flip both bits in the masks of colors that have exactly one of them
+        for k, m in enumerate(self.masks):
+            if bool(m & bit1) != bool(m & bit2):
+                self.masks[k] = m ^ bit1 ^ bit2
+
+    def swap(self, pos1, pos2):
+        '''
+        Swap two items in the grid and check for matches
+
+        Inputs:
+            pos1 (tuple): the coordinate of the first item to swap
+            pos1 (tuple): the coordinate of the second item to swap
+
+        Returns:
+            None
+        '''
+        # Remember the starting score
+        starting_score = self.score
+
+        # Swap the items and check for matches
+        self.exchange(pos1, pos2)
+        self.match()
+
+        # If the swap was useless, swap them back
+        if self.score == starting_score:
+            self.exchange(pos1, pos2)
+
+        # If the swap was valid
+        else:
+            # If no matches exist, shuffle until they do
+            while not self.matches_exist():
+                self.shuffle()
+
+    def swap2(self, pos1, pos2):
+        '''
+        Swap two items in the grid and check for matches. This version of the function does NOT use
+        the matches_exist() function in order to avoid infinite looping
+
+        Inputs:
+            pos1 (tuple): the coordinate of the first item to swap
+            pos1 (tuple): the coordinate of the second item to swap
+
+        Returns:
+            None
+        '''
+        self.exchange(pos1, pos2)
+        self.match()
+
+    def swap2_no_replacement(self, pos1, pos2):
+        '''
+        Swap two items in the grid and score the matches without clearing them. This version of
+        the function does NOT use the matches_exist() function in order to avoid infinite looping
+
+        Inputs:
+            pos1 (tuple): the coordinate of the first item to swap
+            pos1 (tuple): the coordinate of the second item to swap
+
+        Returns:
+            None
+        '''
+        self.exchange(pos1, pos2)
+        self.match_no_replacement()
+
+    def apply_swap(self, pos1, pos2, refill=True):
+        '''
+        Swap two items in the grid and score the result, keeping what is needed to reverse
+        it with undo(). Unlike swap(), a useless swap is not swapped back
+
+        Inputs:
+            pos1 (tuple): the coordinate of the first item to swap
+            pos2 (tuple): the coordinate of the second item to swap
+            refill (bool, optional): if True, clear and refill matches with full playthrough
+                (like swap2). If False, only score the matches made by the swap itself
+                (like swap2_no_replacement)
+
+        Returns:
+            snapshot (Snapshot): the record of the changes, including the points scored
+        '''
+        starting_score = self.score
+
+        # The masks are immutable integers, so keeping them is as cheap as a journal
+        snapshot = Snapshot(list(self.masks))
+
+        if refill:
+            self.swap2(pos1, pos2)
+        else:
+            self.swap2_no_replacement(pos1, pos2)
+
+        snapshot.points = self.score - starting_score
+        return snapshot
+
+    def undo(self, snapshot):
+        '''
+        Restore the board to exactly the state it was in before apply_swap() was called
+
+        Inputs:
+            snapshot (Snapshot): the record returned by apply_swap()
+
+        Returns:
+            None
+        '''
+        self.masks = snapshot.masks
+        self.score -= snapshot.points
+
+    def shuffle(self):
+        '''
+        Randomly shuffle the items on the board and check for matches.
+
+        Inputs:
+            None
+
+        Returns:
+            None
+        '''
+        items = [item for column in self.grid for item in column]
+        self.rng.shuffle(items)
+        self.fill([items[i * self.height:(i + 1) * self.height] for i in range(self.width)])
+
+        # Clear any matches that show up
+        self.match()
+
+    def matches_exist(self):
+        '''
+        Determines if any matches are possible. The board is not modified.
+
+        Inputs:
+            None
+
+        Returns:
+            bool: True if matches are possible, False if not
+        '''
+        return self.has_legal_move()
+
+    def movers(self, d, p):
+        '''
+        Finds every item that makes a match when moved by d bits, using the
+        3-in-a-row templates around the square it moves into
+
+        Inputs:
+            d (int): the move as a bit offset (1 or -1 for j, stride or -stride for i)
+            p (int): the bit offset perpendicular to the move
+
+        Returns:
+            mask (int): the items that make a match with this move
+        '''
+        # Only items whose destination is on the board can move
+        valid = self.full & at(self.full, d, self.full)
+        found = 0
+
+        for m in self.masks:
+            def same(offset):
+                # Items whose destination has this color at the given offset from it
+                return at(m, d + offset, self.full)
+
+            found |= m & valid & (
+                (same(d) & same(2 * d))
+                | (same(p) & same(2 * p))
+                | (same(-p) & same(-2 * p))
+                | (same(p) & same(-p)))
+
+        return found
+
+    def swaps(self):
+        '''
+        Finds every swap that would make a match, as two masks
+
+        Inputs:
+            None
+
+        Returns:
+            down (int): bit (i, j) is set if swapping (i, j) with (i, j + 1) makes a match
+            right (int): bit (i, j) is set if swapping (i, j) with (i + 1, j) makes a match
+        '''
+        s = self.stride
+        down = self.movers(1, s) | (self.movers(-1, s) >> 1)
+        right = self.movers(s, 1) | (self.movers(-s, 1) >> s)
+        return down, right
+
+    def legal_moves(self):
+        '''
+        Lists every swap that would make a match, in the same order that the solvers
+        try them. The board is not modified.
+
+        Inputs:
+            None
+
+        Returns:
+            moves (list): a list of ((i1, j1), (i2, j2)) pairs
+        '''
+        s = self.stride
+        down, right = self.swaps()
+
+        moves = [((b // s, b % s), (b // s, b % s + 1)) for b in bits(down)]
+        moves += [((b // s, b % s), (b // s + 1, b % s)) for b in bits(right)]
+        return moves
+
+    def has_legal_move(self):
+        '''
+        Checks whether any swap would make a match. The board is not modified.
+
+        Inputs:
+            None
+
+        Returns:
+            bool: True if a swap would make a match, False if not
+        '''
+        down, right = self.swaps()
+        return bool(down or right)
+
+
+class Snapshot:
+    '''
+    A record of a swap made by Board.apply_swap(), which Board.undo() uses to restore
+    the board
+    '''
+    def __init__(self, masks):
+        '''
+        Start a record of a swap
+
+        Inputs:
+            masks (list): the masks of the board before the swap
+
+        Returns:
+            None
+        '''
+        self.masks = masks
+
+        # The points scored by the swap and any cascades it caused
+        self.points = 0
+
+
+def at(mask, offset, full):
+    '''
+    A helper function that moves each bit of a mask so that bit b holds what was at
+    bit b + offset, dropping anything that lands off the board
+
+    Inputs:
+        mask (int): the mask to move
+        offset (int): the bit offset to read from
+        full (int): the mask of every square on the board
+
+    Returns:
+        mask (int): the moved mask
+    '''
+    if offset >= 0:
+        return (mask >> offset) & full
+    return (mask << -offset) & full
+
+
+def bits(mask):
+    '''
+    A helper function that lists the positions of the set bits of a mask, lowest first
+
+    Inputs:
+        mask (int): the mask
+
+    Yields:
+        bit (int): the position of each set bit
+    '''
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
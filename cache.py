@@ -0,0 +1,139 @@
+'''
+A bounded cache for solver results. Entries are keyed on the hash of the board
+together with the solver and its parameters, so a board state that comes back
+(after a failed swap, a repeated analysis, or a shuffle onto a known layout) can
+skip a whole solver pass.
+'''
+import sys
+from collections import OrderedDict
+
+
+class TranspositionCache:
+    '''
+    A least recently used cache with a cap on the number of entries and on the
+    approximate memory they use. Hits, misses, and evictions are counted
+    '''
+    def __init__(self, max_entries=100000, max_bytes=None):
+        '''
+        Initialize an empty cache
+
+        Inputs:
+            max_entries (int, optional): the largest number of entries to keep
+            max_bytes (int, optional): the largest approximate size in bytes of the
+                stored entries. Unlimited by default
+
+        Returns:
+            None
+        '''
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+        self.entries = OrderedDict()
+        self.bytes = 0
+
+        # Counters for how well the cache is working
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def get(self, key):
+        '''
+        Look up an entry, marking it as the most recently used
+
+        Inputs:
+            key (tuple): the key of the entry
+
+        Returns:
+            value: the stored value, or None if there is no entry for the key
+        '''
+        if key not in self.entries:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return self.entries[key][0]
+
+    def put(self, key, value):
+        '''
+        Store an entry, evicting the least recently used entries if the cache is full
+
+        Inputs:
+            key (tuple): the key of the entry
+            value: the value to store
+
+        Returns:
+            None
+        '''
+        if key in self.entries:
+            self.bytes -= self.entries.pop(key)[1]
+
+        size = estimate(key) + estimate(value)
+        self.entries[key] = (value, size)
+        self.bytes += size
+
+        # Evict from the least recently used end until both limits are met
+        while self.entries and (len(self.entries) > self.max_entries
+                                or (self.max_bytes is not None and self.bytes > self.max_bytes)):
+            self.bytes -= self.entries.popitem(last=False)[1][1]
+            self.evictions += 1
+
+    def clear(self):
+        '''
+        Remove every entry. The counters are kept
+
+        Inputs:
+            None
+
+        Returns:
+            None
+        '''
+        self.entries.clear()
+        self.bytes = 0
+
+    def stats(self):
+        '''
+        Summarize how well the cache is working
+
+        Inputs:
+            None
+
+        Returns:
+            stats (dict): the hits, misses, evictions, hit rate, entries, and bytes
+        '''
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self.entries),
+            "bytes": self.bytes,
+        }
+
+
+def estimate(value):
+    '''
+    A helper function that estimates the memory used by a value, including the items
+    of any tuples, lists, or dictionaries it contains
+
+    Inputs:
+        value: the value to measure
+
+    Returns:
+        size (int): the approximate size in bytes
+    '''
+    size = sys.getsizeof(value)
+
+    if isinstance(value, dict):
+        size += sum(estimate(k) + estimate(v) for k, v in value.items())
+    elif isinstance(value, (tuple, list)):
+        size += sum(estimate(item) for item in value)
+
+    return size
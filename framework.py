@@ -4,8 +4,10 @@ The board class is defined, as well as helper functions for swapping
 items, checking for matches, and calculating scores.
 '''
 
+import time
+import heapq
 import random
-import copy
+import itertools
 
 
 class Board:
@@ -19,7 +21,8 @@ class Board:
 
     After initializing, boards can swap items and check for matches
      '''
-    def __init__(self, size=5, colors=["r", "g", "b", "y"]):
+    def __init__(self, size=5, colors=["r", "g", "b", "y"], grid=None, rng=None, stats=None,
+                 listener=None, recorder=None, width=None, height=None, weights=None):
         '''
         Initialize the board by randomly populating it and then clearing any matches
         that may appear
@@ -27,17 +30,55 @@ class Board:
         Inputs:
             size (int, optional): a dimension of the square board
             colors (list of strings, optional): the colors with which to populate the board
+            grid (list of lists, optional): a starting grid to copy instead of
+                populating the board randomly
+            rng (random.Random, optional): the random number generator for populating,
+                refilling, and shuffling the board. Defaults to the random module
+            stats (instrument.Stats, optional): counters and timers for the main phases
+                of the game. Nothing is recorded by default
+            listener (function, optional): a function to call with every change made to
+                the board during play. Besides the changes described in report(), it gets
+                {"type": "swapped", "cells": [pos1, pos2]} for every swap and swap back,
+                and {"type": "shuffled", "grid": grid} for every shuffle. None by default
+            recorder (gamelog.Recorder, optional): a recorder to tell about every call to
+                swap(), so that the game can be replayed. None by default
+            width (int, optional): the number of columns, for boards that are not square.
+                Defaults to size
+            height (int, optional): the number of rows, for boards that are not square.
+                Defaults to size
+            weights (list of numbers, optional): how likely each color is to be drawn,
+                in the order of colors. Every color is equally likely by default
 
         Returns:
             None
         '''
-        # Initialize parameters
-        self.size = size
+        # Initialize parameters. A board that is not square has no size, only a width and height
+        self.width = width if width is not None else size
+        self.height = height if height is not None else size
+        self.size = self.width if self.width == self.height else None
         self.colors = colors
+        self.weights = weights
         self.score = 0
 
+        # New pieces come from a buffered stream of colors drawn from the generator
+        self.home = None
+        self.rng = rng if rng is not None else random
+        self.stats = stats
+        self.listener = listener
+        self.recorder = recorder
+
+        # The scores of every swap, made by best_move() the first time it is called
+        self.index = None
+
         # Populate the board randomly as a 2D list of nested lists
-        self.grid = [[random.choice(colors) for i in range(size)] for j in range(size)]
+        if grid is None:
+            self.grid = [self.stream.take(self.height) for i in range(self.width)]
+        else:
+            self.grid = [list(column) for column in grid]
+
+        # Hash the starting board
+        self.zobrist = zobrist_keys(self.width, self.height, colors)
+        self.rehash()
 
         # Clear matches and reset the score
         self.match()
@@ -45,9 +86,38 @@ class Board:
 
         # If no matches exist, shuffle until they do
         while not self.matches_exist():
+            if self.stats is not None:
+                self.stats.count("init shuffles")
             self.shuffle()
             self.score = 0
 
+    @property
+    def rng(self):
+        '''
+        The random number generator that new pieces are drawn from
+        '''
+        return self.stream.rng
+
+    @rng.setter
+    def rng(self, rng):
+        '''
+        Draw new pieces from another generator. Solvers set a generator of their own
+        while they try swaps and then set the board's back, so the board's own stream
+        is kept, with whatever it has buffered, and picks up where it left off
+
+        Inputs:
+            rng (random.Random): the generator to draw from
+
+        Returns:
+            None
+        '''
+        if self.home is not None and rng is self.home.rng:
+            self.stream = self.home
+        else:
+            self.stream = ColorStream(rng, self.colors, self.weights)
+            if self.home is None:
+                self.home = self.stream
+
     def __repr__(self):
         '''
         A string representation of the board which outputs it as a grid with the current score
@@ -58,132 +128,260 @@ class Board:
         Returns:
             None
         '''
-        for i in range(self.size):
+        for i in range(self.height):
             row = ""
-            for j in range(self.size):
+            for j in range(self.width):
                 row += str(self.grid[j][i]) + " "
             print(row)
         return "Score: " + str(self.score)
 
-    def match(self):
+    def scan(self, columns=None, rows=None):
         '''
-        Checks every row and column of the board for matches, scores them, and refills the board
+        Finds and scores the matches in the given columns and rows without changing the board
 
         Inputs:
-            None
+            columns (iterable, optional): the columns to check. Every column by default
+            rows (iterable, optional): the rows to check. Every row by default
 
         Returns:
-            None
+            points (int): the score of the matches found
+            coords (list): the coordinates of every matched item, without repeats
         '''
-        # Run until all matches are cleared because more might show up as the pieces shift
-        while True:
-            # Initialize list of coordinates to remove
-            coords = []
+        if columns is None:
+            columns = range(self.width)
+        if rows is None:
+            rows = range(self.height)
 
-            # Select columns
-            for i in range(self.size):
-                column = self.grid[i]
+        if self.stats is not None:
+            began = time.perf_counter()
+            self.stats.count("scans")
+            self.stats.count("lines scanned", len(columns) + len(rows))
+
+        points = 0
+
+        # Initialize list of coordinates to remove, plus a set for quick lookups
+        coords = []
+        cleared = set()
+
+        # Select columns
+        for i in sorted(columns):
+            column = self.grid[i]
+
+            # Score each match based on how many pieces it contains
+            for start, stop in find_groups(column):
+                points += 2 * (stop - start) - 5
+
+                # Add each coordinate to the list to clear
+                for k in range(start, stop):
+                    coords.append((i, k))
+                    cleared.add((i, k))
+
+        # Repeat for rows
+        for i in sorted(rows):
+            row = [self.grid[j][i] for j in range(self.width)]
+
+            for start, stop in find_groups(row):
+                points += 2 * (stop - start) - 5
+
+                for l in range(start, stop):
+                    # If two matches intersect, add additional points
+                    if (l, i) in cleared:
+                        points += 2
+                        continue
 
-                # Check for matches
-                if group_chk(column) is not None:
-                    grps = group_chk(column).split("s")
+                    coords.append((l, i))
 
-                    # Score each match based on how many pieces it contains
-                    for j in grps[:-1]:
-                        self.score += 2 * len(j) - 5
+        if self.stats is not None:
+            self.stats.add_time("scan", time.perf_counter() - began)
 
-                        # Add each coordinate to the list to clear
-                        for k in list(j):
-                            coords.append((i, k))
+        return points, coords
+
+    def match(self, columns=None, rows=None):
+        '''
+        Checks the board for matches, scores them, and refills the board
 
+        Inputs:
+            columns (iterable, optional): the columns to check on the first pass. Every
+                column by default
+            rows (iterable, optional): the rows to check on the first pass. Every row by default
 
-            # Repeat for rows
-            for i in range(self.size):
-                row = [self.grid[j][i] for j in range(self.size)]
+        Returns:
+            None
+        '''
+        self.cascade(columns, rows)
 
-                if group_chk(row) is not None:
-                    grps = group_chk(row).split("s")
+    def cascade(self, columns=None, rows=None, journal=None):
+        '''
+        Clears and scores matches and refills the board until no matches are left. After the
+        first pass, only the columns that lost items and the rows above the lowest cleared
+        item are checked again, since nothing else can have changed
 
-                    for k in grps[:-1]:
-                        self.score += 2 * len(k) - 5
+        Inputs:
+            columns (iterable, optional): the columns to check on the first pass. Every
+                column by default
+            rows (iterable, optional): the rows to check on the first pass. Every row by default
+            journal (Journal, optional): a journal in which to record every cleared item
 
-                        for l in list(k):
-                            # If two matches intersect, add additional points
-                            if (l, i) in coords:
-                                self.score += 2
-                                continue
+        Returns:
+            None
+        '''
+        if self.stats is not None:
+            self.stats.count("cascades")
 
-                            coords.append((l, i))
+        # Run until all matches are cleared because more might show up as the pieces shift
+        while True:
+            points, coords = self.scan(columns, rows)
 
             # Stop the infinite loop if no matches were found
             if not coords:
                 break
 
-            # Mark all coordinates to remove from the board
-            for i in coords:
-                self.grid[int(i[0])][int(i[1])] = 0
+            self.score += points
+
+            if self.stats is not None:
+                start = time.perf_counter()
+                self.stats.count("cascade rounds")
+                self.stats.count("cleared", len(coords))
+
+            # Remember what was cleared so that it can be put back
+            if journal is not None:
+                journal.points += points
+                journal.steps.append([(i, j, self.grid[i][j]) for i, j in coords])
+
+            # Group the cleared items by column, drawing a random piece for each one in
+            # order. The last piece drawn for a column goes on top
+            cleared = {}
+            fresh = {}
+            for i, j in coords:
+                cleared.setdefault(i, set()).add(j)
+                fresh.setdefault(i, []).append(self.stream.draw())
+
+            # Compact each column in one pass, keeping the items that are left in order
+            # below the new pieces
+            for i, rows_cleared in cleared.items():
+                column = self.grid[i]
+                fresh[i].reverse()
+                fresh[i] += [column[j] for j in range(self.height) if j not in rows_cleared]
+                self.grid[i] = fresh[i]
+
+            # Only the refilled columns and the rows above their lowest cleared item moved
+            columns = cleared.keys()
+            self.rehash(columns)
+            rows = range(max(i[1] for i in coords) + 1)
+
+            # Tell the listener what changed, unless this is a solver trying a swap
+            if self.listener is not None and journal is None:
+                self.report(coords, points)
+
+            if self.stats is not None:
+                self.stats.add_time("refill", time.perf_counter() - start)
 
-            # Pop each marked item out of the board
-            for i in range(self.size):
-                j = 0
-                while True:
-                    try:
-                        if self.grid[i][j] == 0:
-                            self.grid[i].pop(j)
-                        else:
-                            j += 1
-                    except IndexError:
-                        break
+    def report(self, coords, points):
+        '''
+        Send the listener the changes made by one round of clearing, as a dictionary
+        for each change, in this order:
+            {"type": "cleared", "cells": [(i, j), ...]}
+            {"type": "collapsed", "column": i, "moves": [(from j, to j), ...]} for
+                each column that lost items, listing the items that fell
+            {"type": "refilled", "column": i, "cells": [(j, color), ...]} for each
+                column that lost items, listing the new items at the top
+            {"type": "score", "delta": points, "score": total}
 
-            # Refill columns from the top with random pieces
-            for i in coords:
-                self.grid[int(i[0])].insert(0, random.choice(self.colors))
+        Inputs:
+            coords (list): the coordinates of the cleared items
+            points (int): the points scored for them
 
-    def match_no_replacement(self):
+        Returns:
+            None
+        '''
+        # Group the cleared items by column
+        cleared = {}
+        for i, j in coords:
+            cleared.setdefault(i, set()).add(j)
+
+        self.listener({"type": "cleared", "cells": sorted(coords)})
+
+        # Every item above a cleared item falls by the number of cleared items below it
+        for i in sorted(cleared):
+            moves = []
+            drop = 0
+            for j in range(max(cleared[i]), -1, -1):
+                if j in cleared[i]:
+                    drop += 1
+                else:
+                    moves.append((j, j + drop))
+            self.listener({"type": "collapsed", "column": i, "moves": moves})
+
+        for i in sorted(cleared):
+            cells = [(j, self.grid[i][j]) for j in range(len(cleared[i]))]
+            self.listener({"type": "refilled", "column": i, "cells": cells})
+
+        self.listener({"type": "score", "delta": points, "score": self.score})
+
+    def match_no_replacement(self, columns=None, rows=None):
         '''
         The same as the match function, but does not refill the board in
         order to facilitate the solver functions
 
         Inputs:
+            columns (iterable, optional): the columns to check. Every column by default
+            rows (iterable, optional): the rows to check. Every row by default
+
+        Returns:
             None
+        '''
+        self.score += self.scan(columns, rows)[0]
+
+    def exchange(self, pos1, pos2):
+        '''
+        Swap two items in the grid without checking for matches, updating the hash of the board
+
+        Inputs:
+            pos1 (tuple): the coordinate of the first item to swap
+            pos2 (tuple): the coordinate of the second item to swap
 
         Returns:
             None
         '''
-        # Initialize list of coordinates to remove
-        coords = []
+        item1 = self.grid[pos1[0]][pos1[1]]
+        item2 = self.grid[pos2[0]][pos2[1]]
 
-        # Select columns
-        for i in range(self.size):
-            column = self.grid[i]
+        # Take the old items out of the hash and put the new ones in
+        keys1 = self.zobrist[pos1[0]][pos1[1]]
+        keys2 = self.zobrist[pos2[0]][pos2[1]]
+        change = keys1[item1] ^ keys1[item2] ^ keys2[item2] ^ keys2[item1]
 
-            # Check for matches
-            if group_chk(column) is not None:
-                grps = group_chk(column).split("s")
+        self.column_hashes[pos1[0]] ^= keys1[item1] ^ keys1[item2]
+        self.column_hashes[pos2[0]] ^= keys2[item2] ^ keys2[item1]
+        self.hash ^= change
 
-                # Score each match based on how many pieces it contains
-                for j in grps[:-1]:
-                    self.score += 2 * len(j) - 5
+        self.grid[pos1[0]][pos1[1]] = item2
+        self.grid[pos2[0]][pos2[1]] = item1
 
-                    # Add each coordinate to the list to clear
-                    for k in list(j):
-                        coords.append((i, k))
+    def rehash(self, columns=None):
+        '''
+        Recompute the hash of the given columns after they have been changed, and update
+        the hash of the board. The hash of the board is the XOR of a random key for the
+        color of every item (Zobrist hashing), so equal boards have equal hashes
 
-        # Repeat for rows
-        for i in range(self.size):
-            row = [self.grid[j][i] for j in range(self.size)]
+        Inputs:
+            columns (iterable, optional): the columns to recompute. Every column by default
 
-            if group_chk(row) is not None:
-                grps = group_chk(row).split("s")
+        Returns:
+            None
+        '''
+        if columns is None:
+            self.column_hashes = [0] * self.width
+            self.hash = 0
+            columns = range(self.width)
 
-                for k in grps[:-1]:
-                    self.score += 2 * len(k) - 5
+        for i in columns:
+            value = 0
+            for keys, item in zip(self.zobrist[i], self.grid[i]):
+                value ^= keys[item]
 
-                    for l in list(k):
-                        # If two matches intersect, add additional points
-                        if (l, i) in coords:
-                            self.score += 2
-                            continue
+            self.hash ^= self.column_hashes[i] ^ value
+            self.column_hashes[i] = value
 
     def swap(self, pos1, pos2):
         '''
@@ -199,25 +397,29 @@ class Board:
         # Remember the starting score
         starting_score = self.score
 
-        # Swap the items
-        item1 = self.grid[pos1[0]][pos1[1]]
-        item2 = self.grid[pos2[0]][pos2[1]]
+        if self.recorder is not None:
+            self.recorder.record(pos1, pos2)
 
-        self.grid[pos1[0]][pos1[1]] = item2
-        self.grid[pos2[0]][pos2[1]] = item1
+        # Swap the items
+        self.exchange(pos1, pos2)
+        if self.listener is not None:
+            self.listener({"type": "swapped", "cells": [pos1, pos2]})
 
-        # Check for matches
-        self.match()
+        # Check for matches in the columns and rows of the swapped items
+        self.match(*touched(pos1, pos2))
 
         # If the swap was useless, swap them back
         if self.score == starting_score:
-            self.grid[pos1[0]][pos1[1]] = item1
-            self.grid[pos2[0]][pos2[1]] = item2
+            self.exchange(pos1, pos2)
+            if self.listener is not None:
+                self.listener({"type": "swapped", "cells": [pos1, pos2]})
 
         # If the swap was valid
         else:
             # If no matches exist, shuffle until they do
             while not self.matches_exist():
+                if self.stats is not None:
+                    self.stats.count("dead board shuffles")
                 self.shuffle()
 
     def swap2(self, pos1, pos2):
@@ -233,14 +435,12 @@ class Board:
             None
         '''
         # Swap the items
-        item1 = self.grid[pos1[0]][pos1[1]]
-        item2 = self.grid[pos2[0]][pos2[1]]
+        self.exchange(pos1, pos2)
+        if self.listener is not None:
+            self.listener({"type": "swapped", "cells": [pos1, pos2]})
 
-        self.grid[pos1[0]][pos1[1]] = item2
-        self.grid[pos2[0]][pos2[1]] = item1
-
-        # Check for matches
-        self.match()
+        # Check for matches in the columns and rows of the swapped items
+        self.match(*touched(pos1, pos2))
 
     def swap2_no_replacement(self, pos1, pos2):
         '''
@@ -255,14 +455,72 @@ class Board:
             None
         '''
         # Swap the items
-        item1 = self.grid[pos1[0]][pos1[1]]
-        item2 = self.grid[pos2[0]][pos2[1]]
+        self.exchange(pos1, pos2)
 
-        self.grid[pos1[0]][pos1[1]] = item2
-        self.grid[pos2[0]][pos2[1]] = item1
+        # Check for matches in the columns and rows of the swapped items
+        self.match_no_replacement(*touched(pos1, pos2))
+
+    def apply_swap(self, pos1, pos2, refill=True):
+        '''
+        Swap two items in the grid and score the result, recording every change so that
+        it can be reversed with undo(). Unlike swap(), a useless swap is not swapped back
+
+        Inputs:
+            pos1 (tuple): the coordinate of the first item to swap
+            pos2 (tuple): the coordinate of the second item to swap
+            refill (bool, optional): if True, clear and refill matches with full playthrough
+                (like swap2). If False, only score the matches made by the swap itself
+                (like swap2_no_replacement)
+
+        Returns:
+            journal (Journal): the record of the changes, including the points scored
+        '''
+        journal = Journal(pos1, pos2)
+
+        # Every swap a solver tries goes through here
+        if self.stats is not None:
+            self.stats.count("probes")
+
+        # Swap the items
+        self.exchange(pos1, pos2)
+
+        # Check for matches in the columns and rows of the swapped items
+        if refill:
+            self.cascade(*touched(pos1, pos2), journal=journal)
+        else:
+            journal.points = self.scan(*touched(pos1, pos2))[0]
+            self.score += journal.points
+
+        return journal
+
+    def undo(self, journal):
+        '''
+        Restore the board to exactly the state it was in before apply_swap() was called
+
+        Inputs:
+            journal (Journal): the record returned by apply_swap()
+
+        Returns:
+            None
+        '''
+        # Reverse each round of clearing, starting with the last
+        for cleared in reversed(journal.steps):
+            columns = {}
+            for i, j, color in cleared:
+                columns.setdefault(i, {})[j] = color
 
-        # Check for matches
-        self.match_no_replacement()
+            # Drop the pieces that were refilled at the top of each column, and put the
+            # cleared items back where they were in one pass
+            for i, items in columns.items():
+                rest = iter(self.grid[i][len(items):])
+                self.grid[i] = [items[j] if j in items else next(rest) for j in range(self.height)]
+
+            self.rehash(columns)
+
+        # Swap the items back
+        self.exchange(journal.pos1, journal.pos2)
+
+        self.score -= journal.points
 
     def shuffle(self):
         '''
@@ -274,25 +532,34 @@ class Board:
         Returns:
             None
         '''
+        if self.stats is not None:
+            start = time.perf_counter()
+
         # Store all current board items
         items = []
-        for i in range(self.size):
-            for j in range(self.size):
+        for i in range(self.width):
+            for j in range(self.height):
                 items.append(self.grid[i][j])
 
         # Randomize the items and place them back on the board
-        random.shuffle(items)
-        for i in range(self.size):
-            for j in range(self.size):
+        self.rng.shuffle(items)
+        for i in range(self.width):
+            for j in range(self.height):
                 self.grid[i][j] = items.pop()
+        self.rehash()
+
+        if self.listener is not None:
+            self.listener({"type": "shuffled", "grid": [list(column) for column in self.grid]})
 
         # Clear any matches that show up
         self.match()
 
+        if self.stats is not None:
+            self.stats.add_time("shuffle", time.perf_counter() - start)
+
     def matches_exist(self):
         '''
-        Scans the board and tries every possible switch to determine if any
-        matches are possible.
+        Determines if any matches are possible. The board is not modified.
 
         Inputs:
             None
@@ -300,41 +567,548 @@ class Board:
         Returns:
             bool: True if matches are possible, False if not
         '''
-        # Store the state of the grid when the function is run
-        starting_grid = copy.deepcopy(self.grid)
-        starting_score = self.score
+        return self.has_legal_move()
+
+    def makes_match(self, pos1, pos2):
+        '''
+        Checks whether the item at pos1 would be part of a match after moving to the
+        neighboring square pos2, by comparing the colors around pos2 with the 3-in-a-row
+        templates. Nothing is swapped.
+
+        Inputs:
+            pos1 (tuple): the coordinate of the item to move
+            pos2 (tuple): the coordinate of the neighboring square to move it into
+
+        Returns:
+            bool: True if the move makes a match, False if not
+        '''
+        color = self.grid[pos1[0]][pos1[1]]
+        di, dj = pos2[0] - pos1[0], pos2[1] - pos1[1]
+
+        for (a1, b1), (a2, b2) in TEMPLATES[(di, dj)]:
+            i1, j1 = pos2[0] + a1, pos2[1] + b1
+            i2, j2 = pos2[0] + a2, pos2[1] + b2
 
-        # Try swapping every element in the j direction:
-        for i in range(self.size):
-            for j in range(self.size - 1):
-                self.swap2((i, j), (i, j + 1))
+            # Both squares of the template must be on the board and the same color
+            if (0 <= i1 < self.width and 0 <= j1 < self.height
+                    and 0 <= i2 < self.width and 0 <= j2 < self.height
+                    and self.grid[i1][j1] == color and self.grid[i2][j2] == color):
+                return True
 
-                # If the score increases, a match was made
-                if self.score > starting_score:
-                    self.grid = copy.deepcopy(starting_grid)
-                    self.score = starting_score
-                    return True
+        return False
+
+    def legal_moves(self):
+        '''
+        Lists every swap that would make a match, in the same order that the solvers
+        try them: first every swap in the j direction, then every swap in the i direction.
+        The board is not modified.
+
+        Inputs:
+            None
 
-                # Restore the board and continue
-                self.grid = copy.deepcopy(starting_grid)
-                self.score = starting_score
+        Returns:
+            moves (list): a list of ((i1, j1), (i2, j2)) pairs
+        '''
+        moves = []
 
-        # Repeat in the i direction
-        for i in range(self.size - 1):
-            for j in range(self.size):
-                self.swap2((i, j), (i + 1, j))
+        for pos1, pos2 in candidates(self.width, self.height):
+            # A swap makes a match if either item makes a match in its new square
+            if self.grid[pos1[0]][pos1[1]] != self.grid[pos2[0]][pos2[1]] and (
+                    self.makes_match(pos1, pos2) or self.makes_match(pos2, pos1)):
+                moves.append((pos1, pos2))
 
-                if self.score > starting_score:
-                    self.grid = copy.deepcopy(starting_grid)
-                    self.score = starting_score
-                    return True
+        return moves
 
-                self.grid = copy.deepcopy(starting_grid)
-                self.score = starting_score
+    def best_move(self):
+        '''
+        Finds the swap that scores the most on its own, without playthrough, the first
+        one in the order of legal_moves() if several tie. The board keeps a MoveIndex of
+        every swap's score from the first call on, so later calls only score again the
+        swaps near what changed. The board is not modified.
+
+        Inputs:
+            None
+
+        Returns:
+            pair (tuple): the pair of coordinates with the highest score, or ((), ())
+                if no swap makes a match
+        '''
+        if self.index is None:
+            self.index = MoveIndex(self)
+        return self.index.best()[0]
+
+    def has_legal_move(self):
+        '''
+        Checks whether any swap would make a match, stopping at the first one found.
+        The board is not modified.
+
+        Inputs:
+            None
+
+        Returns:
+            bool: True if a swap would make a match, False if not
+        '''
+        for pos1, pos2 in candidates(self.width, self.height):
+            if self.grid[pos1[0]][pos1[1]] != self.grid[pos2[0]][pos2[1]] and (
+                    self.makes_match(pos1, pos2) or self.makes_match(pos2, pos1)):
+                return True
 
-        # If nothing was found, return False
         return False
 
+
+class Journal:
+    '''
+    A record of the changes made to a board by Board.apply_swap(), which Board.undo()
+    uses to restore the board without copying the grid
+    '''
+    def __init__(self, pos1, pos2):
+        '''
+        Start an empty record of a swap
+
+        Inputs:
+            pos1 (tuple): the coordinate of the first item swapped
+            pos2 (tuple): the coordinate of the second item swapped
+
+        Returns:
+            None
+        '''
+        self.pos1 = pos1
+        self.pos2 = pos2
+
+        # The points scored by the swap and any cascades it caused
+        self.points = 0
+
+        # One list of (i, j, color) items for each round of clearing. The pieces refilled
+        # in that round are the top items of the same columns, one per cleared item
+        self.steps = []
+
+class MoveIndex:
+    '''
+    The points every swap on a board would score on its own, as apply_swap() gives
+    with refill=False, kept up to date as the board changes. The swaps are kept in
+    buckets by their points, so the best one is found without trying them all. Columns
+    that changed are found by their hashes, and only the swaps whose matches could
+    reach a changed item are scored again, so keeping up costs about as much as the
+    part of the board that changed rather than the size of the board
+    '''
+    def __init__(self, board):
+        '''
+        Score every swap on the board
+
+        Inputs:
+            board (Board): the board to keep up with
+
+        Returns:
+            None
+        '''
+        self.board = board
+
+        # Every swap by its place in the order of legal_moves(), and its points
+        self.pairs = candidates(board.width, board.height)
+        self.ranks = {pair: rank for rank, pair in enumerate(self.pairs)}
+        self.points = [0] * len(self.pairs)
+
+        # The places of the swaps that score, by their points, with a heap of the places in
+        # each bucket so the first is found without looking through the rest. Places
+        # taken out of a bucket stay in its heap until they reach the top
+        self.buckets = {}
+        self.heaps = {}
+
+        # The board as it was last seen
+        self.columns = [list(column) for column in board.grid]
+        self.hashes = list(board.column_hashes)
+        self.hash = board.hash
+
+        for rank in range(len(self.pairs)):
+            self.rescore(rank)
+
+        if board.stats is not None:
+            board.stats.count("probes", len(self.pairs))
+
+    def best(self):
+        '''
+        Catch up with the board and find the swap that scores the most, the first one
+        in the order of legal_moves() if several tie
+
+        Inputs:
+            None
+
+        Returns:
+            pair (tuple): the pair of coordinates with the highest score, or ((), ())
+                if no swap makes a match
+            points (int): the points it scores
+        '''
+        self.update()
+
+        if not self.buckets:
+            return ((), ()), 0
+
+        # There are only ever a few different scores, so the highest is quick to find
+        points = max(self.buckets)
+        bucket = self.buckets[points]
+        heap = self.heaps[points]
+        while heap[0] not in bucket:
+            heapq.heappop(heap)
+        return self.pairs[heap[0]], points
+
+    def update(self):
+        '''
+        Score again every swap that could have changed since the board was last seen
+
+        Inputs:
+            None
+
+        Returns:
+            None
+        '''
+        board = self.board
+        if board.hash == self.hash:
+            return
+
+        # Find the items that changed in each column whose hash changed
+        dirty = set()
+        for i in range(board.width):
+            if board.column_hashes[i] != self.hashes[i]:
+                column = board.grid[i]
+                seen = self.columns[i]
+                for j in range(board.height):
+                    if column[j] != seen[j]:
+                        self.touch(i, j, dirty)
+
+                self.columns[i] = list(column)
+                self.hashes[i] = board.column_hashes[i]
+
+        self.hash = board.hash
+
+        # Every swap scored again counts as one the solver tried
+        if board.stats is not None:
+            board.stats.count("probes", len(dirty))
+
+        for rank in dirty:
+            self.rescore(rank)
+
+    def touch(self, i, j, dirty):
+        '''
+        Find the swaps whose score could depend on one item. Besides the item's own
+        swaps, a swap elsewhere in its row or column depends on it only if every item
+        in between has the color that the swap brings in, so each direction is followed
+        only as far as a run of one color
+
+        Inputs:
+            i (int): the column of the item
+            j (int): the row of the item
+            dirty (set): the places of the swaps found so far, which is added to
+
+        Returns:
+            None
+        '''
+        grid = self.board.grid
+        self.neighbors(i, j, None, dirty)
+
+        for di, dj in ((0, 1), (0, -1), (1, 0), (-1, 0)):
+            color = None
+            x, y = i + di, j + dj
+            while 0 <= x < self.board.width and 0 <= y < self.board.height:
+                self.neighbors(x, y, color, dirty)
+
+                # Stop where the items in between stop being one color
+                if color is None:
+                    color = grid[x][y]
+                elif grid[x][y] != color:
+                    break
+                x, y = x + di, y + dj
+
+    def neighbors(self, i, j, color, dirty):
+        '''
+        Find the swaps of an item that bring a given color into its square
+
+        Inputs:
+            i (int): the column of the item
+            j (int): the row of the item
+            color (str): the color brought in, or None for every swap of the item
+            dirty (set): the places of the swaps found so far, which is added to
+
+        Returns:
+            None
+        '''
+        grid = self.board.grid
+        for di, dj in ((0, 1), (0, -1), (1, 0), (-1, 0)):
+            x, y = i + di, j + dj
+            if 0 <= x < self.board.width and 0 <= y < self.board.height and (
+                    color is None or grid[x][y] == color):
+                dirty.add(self.ranks[min((i, j), (x, y)), max((i, j), (x, y))])
+
+    def rescore(self, rank):
+        '''
+        Score one swap again and move it to the right bucket
+
+        Inputs:
+            rank (int): the place of the swap in the order of legal_moves()
+
+        Returns:
+            None
+        '''
+        pos1, pos2 = self.pairs[rank]
+        grid = self.board.grid
+        item1 = grid[pos1[0]][pos1[1]]
+        item2 = grid[pos2[0]][pos2[1]]
+
+        # Swapping two items of the same color changes nothing
+        points = 0
+        if item1 != item2:
+            points = self.groups(pos1, item2, pos2) + self.groups(pos2, item1, pos1)
+
+        old = self.points[rank]
+        if points != old:
+            if old:
+                self.buckets[old].discard(rank)
+                if not self.buckets[old]:
+                    del self.buckets[old]
+                    del self.heaps[old]
+
+            if points:
+                bucket = self.buckets.setdefault(points, set())
+                heap = self.heaps.setdefault(points, [])
+                bucket.add(rank)
+                heapq.heappush(heap, rank)
+
+                # Rebuild a heap that has filled up with places no longer in its bucket
+                if len(heap) > 2 * len(bucket) + 16:
+                    heap[:] = sorted(bucket)
+
+            self.points[rank] = points
+
+    def groups(self, pos, color, other):
+        '''
+        Score the groups an item of the given color would make in a square, as scan()
+        would score them, if the item at the other square of the swap were moved there
+
+        Inputs:
+            pos (tuple): the square
+            color (str): the color moved into it
+            other (tuple): the other square of the swap, which holds a different color
+
+        Returns:
+            points (int): the points scored by the groups through the square
+        '''
+        grid = self.board.grid
+        i, j = pos
+        points = 0
+        found = 0
+
+        # Measure the run of the color through the square, down and then across
+        for di, dj in ((0, 1), (1, 0)):
+            length = 1
+            for step in (1, -1):
+                x, y = i + step * di, j + step * dj
+                while (0 <= x < self.board.width and 0 <= y < self.board.height
+                       and (x, y) != other and grid[x][y] == color):
+                    length += 1
+                    x, y = x + step * di, y + step * dj
+
+            if length >= 3:
+                points += 2 * length - 5
+                found += 1
+
+        # An item in both a vertical and a horizontal group scores extra
+        if found == 2:
+            points += 2
+
+        return points
+
+
+class ColorStream:
+    '''
+    A stream of random colors for new pieces, drawn from a generator in blocks rather
+    than one at a time. The first block is small and each one after is twice as big,
+    up to a limit, so a stream that is only used for a few pieces stays cheap. The
+    colors come out in the same order for the same generator, however they are taken
+    '''
+    def __init__(self, rng, colors, weights=None, block=1024):
+        '''
+        Start a stream with nothing buffered
+
+        Inputs:
+            rng (random.Random): the generator to draw from
+            colors (list of strings): the colors to draw
+            weights (list of numbers, optional): how likely each color is to be drawn.
+                Every color is equally likely by default
+            block (int, optional): the most colors to draw from the generator at once
+
+        Returns:
+            None
+        '''
+        self.rng = rng
+        self.colors = colors
+        self.cumulative = list(itertools.accumulate(weights)) if weights is not None else None
+        self.block = block
+        self.size = 16
+        self.buffer = []
+        self.position = 0
+
+    def refill(self):
+        '''
+        Draw the next block of colors, once the last one is used up
+
+        Inputs:
+            None
+
+        Returns:
+            None
+        '''
+        self.buffer = self.rng.choices(self.colors, cum_weights=self.cumulative, k=self.size)
+        self.position = 0
+        self.size = min(2 * self.size, self.block)
+
+    def draw(self):
+        '''
+        Take the next color
+
+        Inputs:
+            None
+
+        Returns:
+            color (str): the color
+        '''
+        if self.position == len(self.buffer):
+            self.refill()
+        self.position += 1
+        return self.buffer[self.position - 1]
+
+    def take(self, k):
+        '''
+        Take the next k colors
+
+        Inputs:
+            k (int): the number of colors
+
+        Returns:
+            colors (list of strings): the colors, in order
+        '''
+        colors = []
+        while len(colors) < k:
+            if self.position == len(self.buffer):
+                self.refill()
+            end = min(len(self.buffer), self.position + k - len(colors))
+            colors += self.buffer[self.position:end]
+            self.position = end
+        return colors
+
+# The Zobrist keys for each shape and set of colors, shared by every board
+ZOBRIST = {}
+
+def zobrist_keys(width, height, colors):
+    '''
+    A helper function that gives every (i, j, color) combination a random 64 bit key
+    for hashing boards. The keys are drawn from a fixed seed, so they are the same for
+    every board of the same shape and colors, and drawing them does not use up numbers
+    from the random module
+
+    Inputs:
+        width (int): the number of columns of the board
+        height (int): the number of rows of the board
+        colors (list of strings): the colors with which the board is populated
+
+    Returns:
+        keys (list): keys[i][j][color] is the key for color at (i, j)
+    '''
+    key = (width, height, tuple(colors))
+    if key not in ZOBRIST:
+        rng = random.Random("{}x{}".format(width, height))
+        ZOBRIST[key] = [[{color: rng.getrandbits(64) for color in colors}
+                         for j in range(height)] for i in range(width)]
+
+    return ZOBRIST[key]
+
+def touched(pos1, pos2):
+    '''
+    A helper function that lists the lines a swap can change. If the board had no matches
+    before the swap, any new match must run through one of these
+
+    Inputs:
+        pos1 (tuple): the coordinate of the first item swapped
+        pos2 (tuple): the coordinate of the second item swapped
+
+    Returns:
+        columns (set): the columns containing the swapped items
+        rows (set): the rows containing the swapped items
+    '''
+    return {pos1[0], pos2[0]}, {pos1[1], pos2[1]}
+
+def candidates(width, height=None):
+    '''
+    A helper function that lists every pair of neighboring coordinates: first every
+    swap in the j direction, then every swap in the i direction
+
+    Inputs:
+        width (int): the number of columns of the board
+        height (int, optional): the number of rows of the board. Defaults to width,
+            for square boards
+
+    Returns:
+        pairs (list): a list of ((i1, j1), (i2, j2)) tuples
+    '''
+    if height is None:
+        height = width
+
+    pairs = [((i, j), (i, j + 1)) for i in range(width) for j in range(height - 1)]
+    pairs += [((i, j), (i + 1, j)) for i in range(width - 1) for j in range(height)]
+    return pairs
+
+def templates(di, dj):
+    '''
+    A helper function that lists the 3-in-a-row templates for an item moving one step
+    in the direction (di, dj). Each template is a pair of offsets from the square moved
+    into; if both squares hold the moving item's color, a match is made
+
+    Inputs:
+        di (int): the step in the i direction (-1, 0, or 1)
+        dj (int): the step in the j direction (-1, 0, or 1)
+
+    Returns:
+        templates (list): a list of ((a1, b1), (a2, b2)) offset pairs
+    '''
+    # The directions perpendicular to the move
+    pi, pj = dj, di
+
+    return [
+        # Two more in the direction of the move
+        ((di, dj), (2 * di, 2 * dj)),
+        # Two more on either side
+        ((pi, pj), (2 * pi, 2 * pj)),
+        ((-pi, -pj), (-2 * pi, -2 * pj)),
+        # One on each side
+        ((pi, pj), (-pi, -pj)),
+    ]
+
+# The templates for each of the four directions a jewel can move
+TEMPLATES = {(di, dj): templates(di, dj) for di, dj in [(1, 0), (-1, 0), (0, 1), (0, -1)]}
+
+def find_groups(row):
+    '''
+    A helper function that identifies groups of three or more of the same item in a list
+
+    Inputs:
+        row (list): the list of items in which to find groups
+
+    Returns:
+        groups (list): a list of (start, stop) tuples, one for each group, where start is
+            the first index of the group and stop is one past its last index
+    '''
+    groups = []
+    start = 0
+
+    # Walk the row, closing a group whenever the item changes or the row ends
+    for j in range(1, len(row) + 1):
+        if j == len(row) or row[j] != row[start]:
+            # Only keep groups of three or more
+            if j - start >= 3:
+                groups.append((start, j))
+
+            start = j
+
+    return groups
+
 def group_chk(row):
     '''
     A helper function that identifies groups of the same item in a list
@@ -347,36 +1121,15 @@ def group_chk(row):
             The groups are separated by the spacer character 's'. If no matches
             are found, returns None.
     '''
-    # Use two pointers
-    i = 0
-    j = 0
-
     # Initialize positions of groups
     positions = []
 
-    # Lengthen input by one to be able to check the end without causing an index error
-    row.append("random garbage")
-
-    # Check for matches
-    while j < len(row):
-        # Count how many consecutive items are the same
-        if row[i] == row[j]:
-            j += 1
+    for start, stop in find_groups(row):
+        for k in range(start, stop):
+            positions.append(str(k))
 
-        # If a group of three or more is found, append its indices to positions
-        elif j - i >= 3:
-            for k in range(i, j):
-                positions.append(str(k))
-
-            # Append a spacer character to positions
-            positions.append("s")
-
-            # Continue moving forward
-            i = j
-
-        else:
-            # Move forward
-            i = j
+        # Append a spacer character to positions
+        positions.append("s")
 
     # Return none if no groups are found
     if not positions:
@@ -0,0 +1,291 @@
+'''
+A compact binary log of played games. A board is decided entirely by its
+parameters and the seed of its random number generator, so a game is stored as
+just those and the list of swaps, four bytes per swap. Replaying a game rebuilds
+every board along the way exactly, without running any solver again.
+
+A log file starts with the bytes b"JWL" and a version number, followed by any
+number of games, each laid out as (all little-endian):
+    engine (1 byte), width (2 bytes), height (2 bytes), number of colors (1 byte),
+    seed (8 bytes), number of swaps (4 bytes), then each color as its length
+    (1 byte) and its UTF-8 bytes, then each swap as 4 bytes: (i * height + j) * 2,
+    plus 1 if the item at (i, j) swaps with (i + 1, j) rather than (i, j + 1)
+Logs of versions 1 and 2 were written before new pieces were drawn in blocks
+from a stream of colors (see framework.ColorStream), so their seeds no longer give
+the same boards. They are refused rather than replayed wrongly.
+'''
+import struct
+import random
+import importlib
+
+
+# The start of every log file, and the version of the layout
+MAGIC = b"JWL"
+VERSION = 3
+
+# Older versions, whose games can no longer be replayed
+STALE = (1, 2)
+
+# The layout of the start of each game, and of each swap
+HEADER = struct.Struct("<BHHBQI")
+MOVE = struct.Struct("<I")
+
+# The board engines by their number in the log. Each is the module that holds its Board
+ENGINES = ["framework", "bitboard", "vectorized"]
+
+
+class Game:
+    '''
+    A game that can be written to or read from a log
+    '''
+    def __init__(self, size, colors, seed, moves=None, engine="framework", width=None, height=None):
+        '''
+        Initialize the game
+
+        Inputs:
+            size (int): a dimension of the square board
+            colors (list of strings): the colors of the board
+            seed (int): the seed of the board's random number generator, from 0 to 2**64 - 1
+            moves (list, optional): the ((i1, j1), (i2, j2)) pairs swapped, in order
+            engine (str, optional): the board engine the game was played on - one of ENGINES
+            width (int, optional): the number of columns, for boards that are not square.
+                Defaults to size
+            height (int, optional): the number of rows, for boards that are not square.
+                Defaults to size
+
+        Returns:
+            None
+        '''
+        self.width = width if width is not None else size
+        self.height = height if height is not None else size
+        self.colors = colors
+        self.seed = seed
+        self.moves = moves if moves is not None else []
+        self.engine = engine
+
+    def board(self, turn=None):
+        '''
+        Rebuild the board as it was after some number of turns
+
+        Inputs:
+            turn (int, optional): the number of swaps to make. Every swap by default
+
+        Returns:
+            board (Board): the board after those swaps
+        '''
+        board = None
+        for board in self.replay(turn):
+            pass
+        return board
+
+    def replay(self, turns=None):
+        '''
+        Play the game again from the start. The same board is changed in place and
+        yielded before the first swap and after every swap
+
+        Inputs:
+            turns (int, optional): the number of swaps to make. Every swap by default
+
+        Yields:
+            board (Board): the board at each point in the game
+        '''
+        engine = importlib.import_module(self.engine)
+        board = engine.Board(colors=self.colors, rng=random.Random(self.seed),
+                             width=self.width, height=self.height)
+
+        yield board
+        for pos1, pos2 in self.moves[:turns]:
+            board.swap(pos1, pos2)
+            yield board
+
+    def encode(self):
+        '''
+        Pack the game into bytes
+
+        Inputs:
+            None
+
+        Returns:
+            data (bytes): the packed game
+        '''
+        data = bytearray(HEADER.pack(ENGINES.index(self.engine), self.width, self.height,
+                                               len(self.colors), self.seed, len(self.moves)))
+
+        for color in self.colors:
+            name = color.encode()
+            data += bytes([len(name)]) + name
+
+        for (i1, j1), (i2, j2) in self.moves:
+            # Store the upper left item and which way it swaps
+            i, j = min(i1, i2), min(j1, j2)
+            data += MOVE.pack((i * self.height + j) * 2 + (i1 != i2))
+
+        return bytes(data)
+
+
+class Recorder:
+    '''
+    Keeps the swaps made on a framework.Board. Give it to the board as its recorder,
+    and the board reports every call to swap()
+    '''
+    def __init__(self, size, colors, seed, engine="framework", width=None, height=None):
+        '''
+        Start recording a game
+
+        Inputs:
+            size (int): a dimension of the square board
+            colors (list of strings): the colors of the board
+            seed (int): the seed of the board's random number generator
+            engine (str, optional): the board engine being played - one of ENGINES
+            width (int, optional): the number of columns, for boards that are not square
+            height (int, optional): the number of rows, for boards that are not square
+
+        Returns:
+            None
+        '''
+        self.game = Game(size, colors, seed, engine=engine, width=width, height=height)
+
+    def record(self, pos1, pos2):
+        '''
+        Add a swap to the game
+
+        Inputs:
+            pos1 (tuple): the coordinate of the first item swapped
+            pos2 (tuple): the coordinate of the second item swapped
+
+        Returns:
+            None
+        '''
+        self.game.moves.append((tuple(pos1), tuple(pos2)))
+
+
+class Writer:
+    '''
+    Appends games to a log file
+    '''
+    def __init__(self, path):
+        '''
+        Open the log for appending, starting a new one if needed
+
+        Inputs:
+            path (str): the path of the log
+
+        Returns:
+            None
+        '''
+        self.file = open(path, "a+b")
+        self.file.seek(0)
+        start = self.file.read(len(MAGIC) + 1)
+
+        # Never add games to a log that could not be read back as one
+        if start:
+            try:
+                check(start, path)
+            except ValueError:
+                self.file.close()
+                raise
+        else:
+            self.file.write(MAGIC + bytes([VERSION]))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def write(self, game):
+        '''
+        Append a game to the log
+
+        Inputs:
+            game (Game): the game to write
+
+        Returns:
+            None
+        '''
+        self.file.write(game.encode())
+        self.file.flush()
+
+    def close(self):
+        '''
+        Close the log
+
+        Inputs:
+            None
+
+        Returns:
+            None
+        '''
+        self.file.close()
+
+
+def read(path):
+    '''
+    Read every game in a log
+
+    Inputs:
+        path (str): the path of the log
+
+    Yields:
+        game (Game): each game, in the order they were written
+    '''
+    with open(path, "rb") as f:
+        data = f.read()
+
+    check(data, path)
+
+    offset = len(MAGIC) + 1
+    while offset < len(data):
+        engine, width, height, count, seed, length = HEADER.unpack_from(data, offset)
+        offset += HEADER.size
+
+        colors = []
+        for k in range(count):
+            colors.append(data[offset + 1:offset + 1 + data[offset]].decode())
+            offset += 1 + data[offset]
+
+        moves = []
+        for (code,) in MOVE.iter_unpack(data[offset:offset + MOVE.size * length]):
+            cell, across = divmod(code, 2)
+            i, j = divmod(cell, height)
+            moves.append(((i, j), (i + 1, j) if across else (i, j + 1)))
+        offset += MOVE.size * length
+
+        yield Game(width, colors, seed, moves, ENGINES[engine], width, height)
+
+
+def check(data, path):
+    '''
+    A helper function that makes sure a file is a game log of the current version
+
+    Inputs:
+        data (bytes): the start of the file
+        path (str): the path of the file, for the error message
+
+    Returns:
+        None
+    '''
+    if data[:len(MAGIC)] != MAGIC or len(data) <= len(MAGIC):
+        raise ValueError("Not a game log: " + str(path))
+
+    version = data[len(MAGIC)]
+    if version in STALE:
+        raise ValueError("{} is a version {} game log, written before new pieces were drawn "
+                         "from a stream of colors. Its games no longer replay from their seeds "
+                         "and cannot be read".format(path, version))
+    if version != VERSION:
+        raise ValueError("Unknown game log version {}: {}".format(version, path))
+
+
+def board_seed(seed):
+    '''
+    A helper function that finds the seed of the board's generator in a game played by
+    runner.py, which draws it first from the seed of the game
+
+    Inputs:
+        seed (int): the seed of the game
+
+    Returns:
+        seed (int): the seed of the board's generator
+    '''
+    return random.Random(seed).getrandbits(64)
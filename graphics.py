@@ -2,11 +2,51 @@
 The script that will run the GUI for the game in Pygame
 '''
 import sys
-import copy
 import random
+import multiprocessing
+
 import pygame
 
-from framework import group_chk
+import framework
+from cache import TranspositionCache
+from gamelog import Recorder, Writer
+from solvers import brute_force, empirical, RolloutPool
+
+
+# The most frames per second to draw
+FPS = 30
+
+# The image file for each color of jewel
+FILES = {
+    "r": "jewels/red.png",
+    "b": "jewels/blue.png",
+    "g": "jewels/green.png",
+    "y": "jewels/yellow.png"
+}
+
+# Every image that has been loaded, by path
+IMAGES = {}
+
+
+def load_image(path):
+    '''
+    A helper function that loads an image from disk the first time it is needed and
+    shares it after that. Once the display has been set up, images are converted to
+    its pixel format so that they draw quickly
+
+    Inputs:
+        path (str): the path of the image
+
+    Returns:
+        image (Surface): the loaded image
+    '''
+    if path not in IMAGES:
+        image = pygame.image.load(path)
+        if pygame.display.get_surface() is not None:
+            image = image.convert_alpha()
+        IMAGES[path] = image
+
+    return IMAGES[path]
 
 
 class Jewel(pygame.sprite.Sprite):
@@ -31,10 +71,24 @@ class Jewel(pygame.sprite.Sprite):
 
         # Update the color, image, and position
         self.color = color
-        self.image = pygame.image.load(self.select_img_file())
+        self.image = load_image(self.select_img_file())
         self.rect = self.image.get_rect()
         self.rect.center = center
 
+    def set_color(self, color):
+        '''
+        Change the color of the jewel, keeping its position
+
+        Inputs:
+            color (str): "r", "g", "b", or "y" for red, green,
+                blue, or yellow
+
+        Returns:
+            None
+        '''
+        self.color = color
+        self.image = load_image(self.select_img_file())
+
     def select_img_file(self):
         '''
         Convert the single character representation
@@ -47,29 +101,22 @@ class Jewel(pygame.sprite.Sprite):
             path (str): the path of the image specified
                 by self.color
         '''
-        files = {
-            "r": "jewels/red.png",
-            "b": "jewels/blue.png",
-            "g": "jewels/green.png",
-            "y": "jewels/yellow.png"
-        }
-        return files[self.color]
+        return FILES[self.color]
 
-class Board(pygame.sprite.RenderUpdates):
+class BoardView(pygame.sprite.RenderUpdates):
+    '''
+    The jewels of a board from the framework.py file, as a group of sprites (subclass of
+    the built-in RenderUpdates class of PyGame). The view listens to the changes the
+    board reports and moves, recolors, or reuses only the jewels that they touch, and
+    remembers where they were and are so that only those parts of the screen are drawn
+    again
     '''
-    A modified version of the board class from the framework.py file. Here, the class
-    is a subclass of the built-in RenderUpdates class of PyGame, and the functions have
-    been modified specifically to interact with the graphical display every time the board
-    is modified
-     '''
-    def __init__(self, size=7, colors=["r", "g", "b", "y"]):
+    def __init__(self, board):
         '''
-        Initialize the board by randomly populating it and then clearing any matches
-        that may appear
+        Make a jewel for every item on the board and start listening to it
 
         Inputs:
-            size (int, optional): a dimension of the square board
-            colors (list of strings, optional): the colors with which to populate the board
+            board (framework.Board): the board to show
 
         Returns:
             None
@@ -77,203 +124,353 @@ class Board(pygame.sprite.RenderUpdates):
         # Initialize the RenderUpdates class
         pygame.sprite.RenderUpdates.__init__(self)
 
-        # Initialize parameters
-        self.size = size
-        self.colors = colors
-        self.score = 0
+        self.board = board
 
-        # Populate the board randomly as a 2D list of nested lists
-        self.grid = [[random.choice(colors) for i in range(size)] for j in range(size)]
+        # The jewel sprites by coordinate, and the ones that were cleared in each column
+        self.jewels = [[Jewel(color=board.grid[i][j], center=center(i, j))
+                        for j in range(board.height)] for i in range(board.width)]
+        self.spare = {}
+        self.add(*[jewel for column in self.jewels for jewel in column])
 
-        # Clear matches and reset the score
-        self.match()
-        self.score = 0
+        # The parts of the screen that changed since the last drawing, starting with all of it
+        self.dirty = []
+        self.mark(*self.sprites())
 
-        # If no matches exist, shuffle until they do
-        while not self.matches_exist():
-            self.shuffle()
-            self.score = 0
+        board.listener = self.apply
 
-        # Update the board and blit everything to the screen
-        self.update()
-
-    def update(self):
+    def mark(self, *sprites):
         '''
-        A function which clears the current board and blits everything to the screen
+        Remember where sprites are, so that that part of the screen is drawn again
 
         Inputs:
-            None
+            *sprites (Sprites): the sprites that moved, changed, or are about to
 
         Returns:
             None
         '''
-        # Empty the board
-        self.empty()
+        self.dirty += [sprite.rect.copy() for sprite in sprites]
 
-        # Refill the board with jewels from the grid
-        for i in range(self.size):
-            for j in range(self.size):
-                self.add(Jewel(color=self.grid[j][i], center=(24 + 50 * j, 24 + 50 * i)))
-
-    def __repr__(self):
+    def show(self, sprite, position):
         '''
-        A string representation of the board which outputs it as a grid with the current score
+        Put an indicator over a jewel, moving it if it is already on the board
 
         Inputs:
-            None
+            sprite (Sprite): the indicator
+            position (tuple): the (i, j) coordinate of the jewel
 
         Returns:
             None
         '''
-        for i in range(self.size):
-            row = ""
-            for j in range(self.size):
-                row += str(self.grid[j][i]) + " "
-            print(row)
-        return "Score: " + str(self.score)
+        if self.has(sprite):
+            self.mark(sprite)
+        sprite.rect.center = center(*position)
+        self.add(sprite)
+        self.mark(sprite)
 
-    def match(self):
+    def hide(self, sprite):
         '''
-        Checks every row and column of the board for matches, scores them, and refills the board
+        Take an indicator off the board, if it is on it
 
         Inputs:
-            None
+            sprite (Sprite): the indicator
 
         Returns:
             None
         '''
-        # Run until all matches are cleared because more might show up as the pieces shift
-        while True:
-            # Initialize list of coordinates to remove
-            coords = []
-
-            # Select columns
-            for i in range(self.size):
-                column = self.grid[i]
-
-                # Check for matches
-                if group_chk(column) is not None:
-                    grps = group_chk(column).split("s")
-
-                    # Score each match based on how many pieces it contains
-                    for j in grps[:-1]:
-                        self.score += 2 * len(j) - 5
-
-                        # Add each coordinate to the list to clear
-                        for k in list(j):
-                            coords.append((i, k))
+        if self.has(sprite):
+            self.mark(sprite)
+            self.remove(sprite)
 
+    def redraw(self, screen, background):
+        '''
+        Erase and draw again only the parts of the screen that changed. Drawing is clipped
+        to each part, so the edges of the sprites around it are not drawn twice
 
-            # Repeat for rows
-            for i in range(self.size):
-                row = [self.grid[j][i] for j in range(self.size)]
+        Inputs:
+            screen (Surface): the display
+            background (Surface): the plain background to erase to
 
-                if group_chk(row) is not None:
-                    grps = group_chk(row).split("s")
+        Returns:
+            rects (list of Rects): the parts of the screen that were drawn
+        '''
+        # The same square is often marked more than once, e.g. by a collapse and a refill
+        rects = list({tuple(rect): rect for rect in self.dirty}.values())
+        self.dirty = []
+
+        # Sprites are drawn in the order they were added, so indicators stay on top
+        sprites = self.sprites()
+        for rect in rects:
+            screen.set_clip(rect)
+            screen.blit(background, rect, rect)
+            for sprite in sprites:
+                if sprite.rect.colliderect(rect):
+                    screen.blit(sprite.image, sprite.rect)
+        screen.set_clip(None)
+
+        return rects
+
+    def apply(self, event):
+        '''
+        Apply one change reported by the board to the jewels
 
-                    for k in grps[:-1]:
-                        self.score += 2 * len(k) - 5
+        Inputs:
+            event (dict): the change, as described in framework.Board.report()
 
-                        for l in list(k):
-                            # If two matches intersect, add additional points
-                            if (l, i) in coords:
-                                self.score += 2
-                                continue
+        Returns:
+            None
+        '''
+        kind = event["type"]
+
+        if kind == "swapped":
+            (i1, j1), (i2, j2) = event["cells"]
+            self.mark(self.jewels[i1][j1], self.jewels[i2][j2])
+            self.jewels[i1][j1], self.jewels[i2][j2] = self.jewels[i2][j2], self.jewels[i1][j1]
+            self.jewels[i1][j1].rect.center = center(i1, j1)
+            self.jewels[i2][j2].rect.center = center(i2, j2)
+
+        # Keep the cleared jewels to use again for the refills
+        elif kind == "cleared":
+            for i, j in event["cells"]:
+                self.mark(self.jewels[i][j])
+                self.spare.setdefault(i, []).append(self.jewels[i][j])
+                self.jewels[i][j] = None
+
+        # The moves go from the bottom up, so no jewel lands on one that has not moved yet
+        elif kind == "collapsed":
+            column = self.jewels[event["column"]]
+            for start, stop in event["moves"]:
+                self.mark(column[start])
+                column[stop], column[start] = column[start], None
+                column[stop].rect.center = center(event["column"], stop)
+                self.mark(column[stop])
+
+        elif kind == "refilled":
+            i = event["column"]
+            for j, color in event["cells"]:
+                jewel = self.spare[i].pop()
+                jewel.set_color(color)
+                jewel.rect.center = center(i, j)
+                self.jewels[i][j] = jewel
+                self.mark(jewel)
+
+        elif kind == "shuffled":
+            for i, column in enumerate(event["grid"]):
+                for j, color in enumerate(column):
+                    if self.jewels[i][j].color != color:
+                        self.jewels[i][j].set_color(color)
+                        self.mark(self.jewels[i][j])
 
-                            coords.append((l, i))
+class Selector(pygame.sprite.Sprite):
+    '''
+    A class which will represent the currently selected jewel
+    '''
+    def __init__(self, center=(0, 0)):
+        '''
+        Initialize the selector at a certain position on the board
 
-            # Stop the infinite loop if no matches were found
-            if not coords:
-                break
+        Inputs:
+            center (tuple): the coordinates (in pixels) of the
+                center of the selector
+        Returns:
+            None
+        '''
+        # Initialize as a pygame sprite
+        pygame.sprite.Sprite.__init__(self)
 
-            # Mark all coordinates to remove from the board
-            for i in coords:
-                self.grid[int(i[0])][int(i[1])] = 0
+        # Update the color, image, and position
+        self.image = load_image("jewels/outline.png")
+        self.rect = self.image.get_rect()
+        self.rect.center = center
 
-            # Pop each marked item out of the board
-            for i in range(self.size):
-                j = 0
-                while True:
-                    try:
-                        if self.grid[i][j] == 0:
-                            self.grid[i].pop(j)
-                        else:
-                            j += 1
-                    except IndexError:
-                        break
+class Text:
+    '''
+    A line of text that is only rendered again when it changes
+    '''
+    def __init__(self, font, color=(250, 250, 250)):
+        '''
+        Initialize the text without rendering anything
 
-            # Refill columns from the top with random pieces
-            for i in coords:
-                self.grid[int(i[0])].insert(0, random.choice(self.colors))
+        Inputs:
+            font (Font): the font to render with
+            color (tuple, optional): the color of the text
 
-        # Update the board
-        self.update()
+        Returns:
+            None
+        '''
+        self.font = font
+        self.color = color
+        self.value = None
+        self.image = None
 
-    def swap(self, pos1, pos2):
+    def render(self, value):
         '''
-        Swap two items in the grid and check for matches
+        Get the rendered text, rendering it only if it differs from last time
 
         Inputs:
-            pos1 (tuple): the coordinate of the first item to swap
-            pos1 (tuple): the coordinate of the second item to swap
+            value (str): the text to show
 
         Returns:
-            None
+            image (Surface): the rendered text
         '''
-        # Remember the starting score
-        starting_score = self.score
+        if value != self.value:
+            self.value = value
+            self.image = self.font.render(value, True, self.color)
 
-        # Swap the items
-        item1 = self.grid[pos1[0]][pos1[1]]
-        item2 = self.grid[pos2[0]][pos2[1]]
+        return self.image
 
-        self.grid[pos1[0]][pos1[1]] = item2
-        self.grid[pos2[0]][pos2[1]] = item1
+def think(connection, grid, width, height, colors, solver, loops):
+    '''
+    Run a solver on a copy of the board in a separate process and send back its pair
 
-        # Check for matches
-        self.match()
+    Inputs:
+        connection (Connection): the end of the pipe to send the pair through
+        grid (list of lists): the grid of the board
+        width (int): the number of columns of the board
+        height (int): the number of rows of the board
+        colors (list of strings): the colors of the board
+        solver (str): "brute force" or "empirical"
+        loops (int): if using "empirical", the number of loops to run
 
-        # If the swap was useless, swap them back
-        if self.score == starting_score:
-            self.grid[pos1[0]][pos1[1]] = item1
-            self.grid[pos2[0]][pos2[1]] = item2
+    Returns:
+        None
+    '''
+    board = framework.Board(colors=colors, grid=grid, rng=random.Random(), width=width, height=height)
 
-        # If the swap was valid
-        else:
-            # If no matches exist, shuffle until they do
-            while not self.matches_exist():
-                self.shuffle()
+    if solver == "empirical":
+        pair = empirical(board, loops)
+    else:
+        pair = brute_force(board)
 
-        # Update the board
-        self.update()
+    connection.send(pair)
+    connection.close()
 
-    def swap2(self, pos1, pos2):
+class Hint:
+    '''
+    Finds the pair a solver would swap in the background, so that the game keeps
+    running. The loops of the empirical solver are shared by a pool of worker
+    processes that is started once and kept for every hint, and other solvers run in
+    a process of their own. Each search can be cancelled, and the answers are cached
+    by the hash of the board
+    '''
+    def __init__(self, solver="empirical", loops=20, workers=None):
+        '''
+        Initialize with no search running
+
+        Inputs:
+            solver (str, optional): "brute force" or "empirical"
+            loops (int, optional): if using "empirical", the number of loops to run
+            workers (int, optional): if using "empirical", the number of worker
+                processes to share the loops. Defaults to the number of CPUs
+
+        Returns:
+            None
+        '''
+        self.solver = solver
+        self.loops = loops
+        self.workers = workers
+        self.cache = TranspositionCache(max_entries=1000)
+        self.pool = RolloutPool(workers) if solver == "empirical" else None
+
+        # The running search (a process, or the loops on the pool), and the board it is for
+        self.process = None
+        self.connection = None
+        self.job = None
+        self.key = None
+
+    def request(self, board):
         '''
-        Swap two items in the grid and check for matches. This version of the function does NOT use
-        the matches_exist() function in order to avoid infinite looping
+        Start looking for a hint for the board, unless one is already known or running
 
         Inputs:
-            pos1 (tuple): the coordinate of the first item to swap
-            pos1 (tuple): the coordinate of the second item to swap
+            board (framework.Board): the board to find a hint for
 
         Returns:
             None
         '''
-        # Swap the items
-        item1 = self.grid[pos1[0]][pos1[1]]
-        item2 = self.grid[pos2[0]][pos2[1]]
+        key = ("hint", self.solver, self.loops, board.width, board.height, tuple(board.colors),
+               board.hash)
+        if key == self.key or key in self.cache:
+            return
+
+        self.cancel()
+        self.key = key
+
+        # The loops draw from a generator of their own, so the game's refills do not change
+        if self.pool is not None:
+            self.job = self.pool.submit(board, self.loops, random.Random())
+            return
+
+        self.connection, child = multiprocessing.Pipe(duplex=False)
+        self.process = multiprocessing.Process(
+            target=think, daemon=True,
+            args=(child, [list(column) for column in board.grid], board.width, board.height,
+                  board.colors, self.solver, self.loops))
+        self.process.start()
+        child.close()
+
+    def result(self, board):
+        '''
+        Get the hint for the board if it is ready. Never waits
 
-        self.grid[pos1[0]][pos1[1]] = item2
-        self.grid[pos2[0]][pos2[1]] = item1
+        Inputs:
+            board (framework.Board): the board to get the hint for
 
-        # Check for matches
-        self.match()
+        Returns:
+            pair (tuple): the pair of coordinates to swap, or None if it is not ready
+        '''
+        # Collect the loops from the pool once every worker is done. If a worker died, the
+        # pool cannot be used again, so a new one is started for the next hint
+        if self.job is not None and self.job.done():
+            try:
+                frequencies = self.job.frequencies()
+            except Exception:
+                self.cancel()
+                self.pool.close()
+                self.pool = RolloutPool(self.workers)
+            else:
+                self.cache.put(self.key, max(frequencies, key=frequencies.get))
+                self.job = None
+                self.key = None
+
+        # Collect the answer of a search that has finished
+        elif self.process is not None and self.connection.poll():
+            # The pipe of a process that died without answering reads as closed
+            try:
+                pair = self.connection.recv()
+            except EOFError:
+                self.cancel()
+            else:
+                self.cache.put(self.key, pair)
+                self.process.join()
+                self.process = None
+                self.connection.close()
+                self.key = None
+
+        # Give up on a search whose process died without answering. The pipe is checked
+        # again in case the answer arrived just before the process exited
+        elif (self.process is not None and self.process.exitcode is not None
+              and not self.connection.poll()):
+            self.cancel()
+
+        key = ("hint", self.solver, self.loops, board.width, board.height, tuple(board.colors),
+               board.hash)
+        return self.cache.get(key) if key in self.cache else None
+
+    def pending(self):
+        '''
+        Check whether a search is running
 
-        self.update()
+        Inputs:
+            None
 
-    def shuffle(self):
+        Returns:
+            bool: True if a search is running, False if not
         '''
-        Randomly shuffle the items on the board and check for matches.
+        return self.process is not None or self.job is not None
+
+    def cancel(self):
+        '''
+        Stop the running search, if there is one
 
         Inputs:
             None
@@ -281,216 +478,257 @@ class Board(pygame.sprite.RenderUpdates):
         Returns:
             None
         '''
-        # Store all current board items
-        items = []
-        for i in range(self.size):
-            for j in range(self.size):
-                items.append(self.grid[i][j])
-
-        # Randomize the items and place them back on the board
-        random.shuffle(items)
-        for i in range(self.size):
-            for j in range(self.size):
-                self.grid[i][j] = items.pop()
+        if self.process is not None:
+            self.process.terminate()
+            self.process.join()
+            self.connection.close()
 
-        # Clear any matches that show up
-        self.match()
+        if self.job is not None:
+            self.job.cancel()
 
-        # Update the board
-        self.update()
+        self.process = None
+        self.connection = None
+        self.job = None
+        self.key = None
 
-    def matches_exist(self):
+    def close(self):
         '''
-        Scans the board and tries every possible switch to determine if any
-        matches are possible.
+        Stop the running search and shut down the pool of worker processes
 
         Inputs:
             None
 
         Returns:
-            bool: True if matches are possible, False if not
+            None
         '''
-        # Store the state of the grid when the function is run
-        starting_grid = copy.deepcopy(self.grid)
-        starting_score = self.score
-
-        # Try swapping every element in the j direction:
-        for i in range(self.size):
-            for j in range(self.size - 1):
-                self.swap2((i, j), (i, j + 1))
+        self.cancel()
+        if self.pool is not None:
+            self.pool.close()
+            self.pool = None
 
-                # If the score increases, a match was made
-                if self.score > starting_score:
-                    self.grid = copy.deepcopy(starting_grid)
-                    self.score = starting_score
-                    return True
+def save(board, log):
+    '''
+    A helper function that appends the game recorded on a board to a game log, once
 
-                # Restore the board and continue
-                self.grid = copy.deepcopy(starting_grid)
-                self.score = starting_score
+    Inputs:
+        board (framework.Board): the board, with its recorder
+        log (str): the path of the log, or None to not save the game
 
-        # Repeat in the i direction
-        for i in range(self.size - 1):
-            for j in range(self.size):
-                self.swap2((i, j), (i + 1, j))
+    Returns:
+        None
+    '''
+    if log is None or board.recorder is None:
+        return
 
-                if self.score > starting_score:
-                    self.grid = copy.deepcopy(starting_grid)
-                    self.score = starting_score
-                    return True
+    with Writer(log) as writer:
+        writer.write(board.recorder.game)
+    board.recorder = None
 
-                self.grid = copy.deepcopy(starting_grid)
-                self.score = starting_score
+def center(i, j):
+    '''
+    A helper function that maps a jewel to the position of its center on the screen
 
-        # If nothing was found, return False
-        return False
+    Inputs:
+        i (int): the column of the jewel
+        j (int): the row of the jewel
 
-class Selector(pygame.sprite.Sprite):
+    Returns:
+        center (tuple): the coordinates (in pixels) of the center of the jewel
     '''
-    A class which will represent the currently selected jewel
+    return (24 + 50 * i, 24 + 50 * j)
+
+def cell(position):
     '''
-    def __init__(self, center=(0, 0)):
-        '''
-        Initialize the selector at a certain position on the board
+    A helper function that maps a position on the screen to the jewel under it
 
-        Inputs:
-            center (tuple): the coordinates (in pixels) of the
-                center of the selector
-        Returns:
-            None
-        '''
-        # Initialize as a pygame sprite
-        pygame.sprite.Sprite.__init__(self)
+    Inputs:
+        position (tuple): the coordinates (in pixels) of the point
 
-        # Update the color, image, and position
-        self.image = pygame.image.load("jewels/outline.png")
-        self.rect = self.image.get_rect()
-        self.rect.center = center
+    Returns:
+        coordinate (tuple): the (i, j) coordinate of the jewel
+    '''
+    return (max(position[0] - 1, 0) // 50, max(position[1] - 1, 0) // 50)
 
-def main(size=7, turns=10):
+def main(size=7, turns=10, solver="empirical", loops=20, log=None, width=None, height=None,
+         workers=None):
     '''
-    The script that will run the game
+    The script that will run the game. The loop sleeps until something happens, and
+    only the parts of the screen that changed are drawn again. Pressing H shows a hint,
+    which is worked out in the background
 
     Inputs:
         turns (int): the number of turns to play
         size (int): the size of the board to play on (between 5 and 10 recommended)
+        solver (str, optional): the solver for hints, "brute force" or "empirical"
+        loops (int, optional): if using "empirical", the number of loops to run for hints
+        log (str, optional): a game log to append the game to when it ends, so that it
+            can be replayed with gamelog.read()
+        width (int, optional): the number of columns, for boards that are not square.
+            Defaults to size
+        height (int, optional): the number of rows, for boards that are not square.
+            Defaults to size
+        workers (int, optional): if using "empirical", the number of worker processes
+            that share the loops of each hint. Defaults to the number of CPUs
 
     Returns:
         None
     '''
-    # Initialize a board object
-    board = Board(size=size)
-
     # Initialize the display based on the board size selected
     pygame.init()
     pygame.display.set_caption("Bejeweled But Worse")
-    dimensions = board.size * 50, board.size * 50 + 40
+    width = width if width is not None else size
+    height = height if height is not None else size
+    dimensions = width * 50, height * 50 + 40
     screen = pygame.display.set_mode(dimensions)
-
-    # Initialize a font for displaying the score
+    clock = pygame.time.Clock()
+
+    # Initialize a board object, and the view of it after the display so that its images
+    # match the display format
+    seed = random.getrandbits(64)
+    board = framework.Board(rng=random.Random(seed), width=width, height=height,
+                            recorder=Recorder(size, ["r", "g", "b", "y"], seed,
+                                              width=width, height=height))
+    view = BoardView(board)
+
+    # The plain background that sprites are erased to, and the strip the text goes in
+    background = pygame.Surface(dimensions).convert()
+    background.fill((0, 0, 0))
+    status = pygame.Rect(0, 50 * height, 50 * width, 40)
+    screen.blit(background, (0, 0))
+
+    # Initialize a font for displaying the score, and the text it will show
     font = pygame.font.Font('freesansbold.ttf', 24)
+    game_over_text = Text(font)
+    score_label = Text(font)
+    turns_label = Text(font)
+
+    # A single selection indicator, which is only in the view while a jewel is selected
+    selector = Selector()
+
+    # The hint solver, and the two indicators that show its pair once it is found
+    hint = Hint(solver, loops, workers)
+    markers = [Selector(), Selector()]
+    hinting = False
 
     # Initialize the mouse position and the current number of turns
     pos = None
     count = 0
 
+    # Draw the text once to start, and the game over message once the game ends
+    shown = None
+    game_over = None
+
     # Run the game
     while True:
-        # If the number of turns has been met, show the game over screen
-        if count == turns:
-            # Quit when the quit button is pressed
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    sys.exit()
-
-            # Clear the screen
-            screen.fill((0, 0, 0))
-
-            # Blit the game over message to the screen, along with the board
-            game_over = font.render("Game Over!", True, (250, 250, 250))
-            over_rect = game_over.get_rect()
-            over_rect.center = (int(50 * board.size / 2), int(50 * board.size / 2))
-            screen.blit(game_over, over_rect)
-            screen.blit(score_text, score_rect)
-
-            # Flip the display
-            pygame.display.flip()
-
-        # If there are turns still to be played
-        else:
+        # Wait for something to happen, then take everything else that is queued. While a
+        # hint is being worked out, wake up regularly to check on it
+        first = pygame.event.wait(1000 // FPS) if hint.pending() else pygame.event.wait()
+        for event in [first] + pygame.event.get():
             # Exit the game if a quit event has been queued
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    sys.exit()
-
-                # When the mouse is pressed, get its position
-                elif event.type == pygame.MOUSEBUTTONDOWN:
-                    # Save the score
-                    original_score = board.score
-
-                    # Map the i coordinate to a jewel
-                    i = 0
-                    x_click = event.__dict__["pos"][0]
-                    x_bound = 50
-                    while x_click > x_bound:
-                        i += 1
-                        x_bound += 50
-
-                    # Map the j coordinate to a jewel
-                    j = 0
-                    y_click = event.__dict__["pos"][1]
-                    y_bound = 50
-                    while y_click > y_bound:
-                        j += 1
-                        y_bound += 50
-
-                    # If no jewel has been clicked yet, initialize this jewel
-                    if pos is None:
-                        pos = (i, j)
-
-                    # If a first jewel has been clicked, check if this jewel is a neighbor
-                    else:
-                        if (i, j) in [(pos[0] + 1, pos[1]), (pos[0] - 1, pos[1]),
-                            (pos[0], pos[1] + 1), (pos[0], pos[1] - 1)]:
-
-                            # Swap the two if yes
-                            board.swap(pos, (i, j))
-
-                            if original_score < board.score:
-                                # Increment turns if a scoring move was made
-                                count += 1
-
-                            pos = None
-
-                        else:
-                            # If not a neighbor, update position
-                            pos = (i, j)
-                            board.update()
-
-            # Clear the screen
-            screen.fill((0, 0, 0))
-
-            # Redraw the background
-            board.draw(screen)
+            if event.type == pygame.QUIT:
+                hint.close()
+                save(board, log)
+                sys.exit()
+
+            # Ask for a hint when H is pressed
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_h and count < turns:
+                hint.request(board)
+                hinting = True
+
+            # When the mouse is pressed during the game, get its position
+            elif event.type == pygame.MOUSEBUTTONDOWN and count < turns:
+                # Save the score
+                original_score = board.score
+
+                # Map the click to a jewel, ignoring clicks on the text
+                i, j = cell(event.pos)
+                if j >= board.height:
+                    continue
+
+                # If no jewel has been clicked yet, initialize this jewel
+                if pos is None:
+                    pos = (i, j)
+
+                # If a first jewel has been clicked, check if this jewel is a neighbor
+                elif (i, j) in [(pos[0] + 1, pos[1]), (pos[0] - 1, pos[1]),
+                                (pos[0], pos[1] + 1), (pos[0], pos[1] - 1)]:
+
+                    # Swap the two if yes, dropping any hint for the old board
+                    board.swap(pos, (i, j))
+                    hint.cancel()
+                    hinting = False
+                    for marker in markers:
+                        view.hide(marker)
+
+                    if original_score < board.score:
+                        # Increment turns if a scoring move was made
+                        count += 1
+
+                    pos = None
+
+                else:
+                    # If not a neighbor, update position
+                    pos = (i, j)
+
+                # Move the selection indicator, or take it off the board
+                if pos is not None:
+                    view.show(selector, pos)
+                else:
+                    view.hide(selector)
+
+        # Show the hint once it is ready
+        if hinting:
+            pair = hint.result(board)
+            if pair is not None:
+                for marker, position in zip(markers, pair):
+                    view.show(marker, position)
+                hinting = False
+
+            # Stop waiting if the search failed
+            elif not hint.pending():
+                hinting = False
+
+        rects = []
+
+        # Erase and draw again only the jewels and indicators that changed
+        if view.dirty:
+            rects += view.redraw(screen, background)
+
+            # Put the game over message back over any jewels drawn under it
+            if game_over is not None and over_rect.collidelist(rects) != -1:
+                screen.blit(game_over, over_rect)
+                rects.append(over_rect)
+
+        # Draw the text again only if the score or the number of turns changed
+        if shown != (board.score, count):
+            shown = (board.score, count)
+            screen.blit(background, status, status)
 
             # Display the score at the bottom left
-            score_text = font.render("Score: " + str(board.score), True, (250, 250, 250))
+            score_text = score_label.render("Score: " + str(board.score))
             score_rect = score_text.get_rect()
-            score_rect.top = 5 + 50 * board.size
+            score_rect.top = 5 + 50 * board.height
             screen.blit(score_text, score_rect)
 
             # Display the number of turns at the bottom right
-            turns_text = font.render("Turns: " + str(turns - count), True, (250, 250, 250))
-            turns_rect = score_text.get_rect()
-            turns_rect.top = 5 + 50 * board.size
-            turns_rect.right = 50 * board.size - 25
+            turns_text = turns_label.render("Turns: " + str(turns - count))
+            turns_rect = turns_text.get_rect()
+            turns_rect.top = 5 + 50 * board.height
+            turns_rect.right = 50 * board.width - 25
             screen.blit(turns_text, turns_rect)
 
-            # Display a selection indicator
-            if pos is not None:
-                center = (24 + 50 * pos[0], 24 + 50 * pos[1])
-                selector = Selector(center)
-                selector.add(board)
-
-            # Refresh the display
-            pygame.display.flip()
+            # If the number of turns has been met, show the game over message over the board
+            if count == turns:
+                save(board, log)
+                game_over = game_over_text.render("Game Over!")
+                over_rect = game_over.get_rect()
+                over_rect.center = (int(50 * board.width / 2), int(50 * board.height / 2))
+                screen.blit(game_over, over_rect)
+                rects.append(over_rect)
+
+            rects.append(status)
+
+        # Refresh only the parts of the display that changed, at most FPS times a second
+        if rects:
+            pygame.display.update(rects)
+        clock.tick(FPS)
@@ -0,0 +1,100 @@
+'''
+Counters and timers for the main phases of a game: scanning for matches, clearing
+and refilling, reshuffling dead boards, and the swaps the solvers try. A Stats
+object is handed to a framework.Board, which reports to it as it plays. Boards
+without one skip all of this, so instrumentation costs nothing unless it is used.
+'''
+import time
+import contextlib
+
+
+class Stats:
+    '''
+    A collection of named counters, timers, and samples
+    '''
+    def __init__(self):
+        '''
+        Initialize empty counters
+
+        Inputs:
+            None
+
+        Returns:
+            None
+        '''
+        self.counts = {}
+        self.times = {}
+        self.samples = {}
+
+    def count(self, name, n=1):
+        '''
+        Add to a counter
+
+        Inputs:
+            name (str): the name of the counter
+            n (int, optional): the amount to add
+
+        Returns:
+            None
+        '''
+        self.counts[name] = self.counts.get(name, 0) + n
+
+    def add_time(self, name, seconds):
+        '''
+        Add to a timer
+
+        Inputs:
+            name (str): the name of the timer
+            seconds (float): the time to add
+
+        Returns:
+            None
+        '''
+        self.times[name] = self.times.get(name, 0.0) + seconds
+
+    @contextlib.contextmanager
+    def timer(self, name):
+        '''
+        Time the body of a with statement
+
+        Inputs:
+            name (str): the name of the timer
+
+        Returns:
+            None
+        '''
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def sample(self, name, value):
+        '''
+        Keep one value of a quantity that changes from call to call, like the number of
+        swaps a solver tries each turn
+
+        Inputs:
+            name (str): the name of the quantity
+            value (number): the value to keep
+
+        Returns:
+            None
+        '''
+        self.samples.setdefault(name, []).append(value)
+
+    def summary(self):
+        '''
+        Summarize everything collected so far in a form that can be written as JSON
+
+        Inputs:
+            None
+
+        Returns:
+            summary (dict): the counts, the times in seconds, and every sample
+        '''
+        return {
+            "counts": dict(self.counts),
+            "times": dict(self.times),
+            "samples": {name: list(values) for name, values in self.samples.items()},
+        }
@@ -0,0 +1,279 @@
+'''
+Renders games recorded by runner.py to images without opening a window, so that
+the moves of a solver can be looked over for thousands of games. Each game is
+replayed from its seed and its moves, and either every turn is saved as its own
+frame or all of a game's turns are tiled into one contact sheet. Drawing happens
+in this process with the images from graphics.py loaded once, and encoding the
+image files is spread across a pool of worker processes.
+
+Run this file from the command line with a file of records, e.g.
+    python3 runner.py --games 100 --out games.jsonl
+    python3 render.py games.jsonl --out frames --sheet --workers 8
+'''
+import os
+
+# Draw offscreen, without a window
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import sys
+import json
+import zlib
+import random
+import argparse
+import multiprocessing
+
+import pygame
+
+import graphics
+from runner import ENGINES
+
+
+# The colors of the plain tiles drawn for colors that have no jewel image, such as the
+# extra colors of benchmarks.PALETTE. Any other color gets a shade made from its name
+TILES = {
+    "o": (255, 140, 0),
+    "p": (160, 60, 220),
+    "c": (0, 200, 210),
+    "w": (235, 235, 235),
+}
+
+
+class Renderer:
+    '''
+    Draws boards to offscreen surfaces, sharing the jewel images, the font, and the
+    background between every frame
+    '''
+    def __init__(self, width, height):
+        '''
+        Initialize the renderer for boards of one shape
+
+        Inputs:
+            width (int): the number of columns of the board
+            height (int): the number of rows of the board
+
+        Returns:
+            None
+        '''
+        # A tiny display is needed for images to be converted to a fast pixel format
+        pygame.init()
+        if pygame.display.get_surface() is None:
+            pygame.display.set_mode((1, 1))
+
+        self.width = width
+        self.height = height
+        self.dimensions = width * 50, height * 50 + 40
+        self.font = pygame.font.Font('freesansbold.ttf', 24)
+
+        self.background = pygame.Surface(self.dimensions).convert()
+        self.background.fill((0, 0, 0))
+
+        # The plain tiles drawn so far, by color
+        self.tiles = {}
+
+    def image(self, color):
+        '''
+        The image for one color: its jewel if there is one, and a plain tile if not
+
+        Inputs:
+            color (str): the color
+
+        Returns:
+            image (Surface): the image
+        '''
+        if color in graphics.FILES:
+            return graphics.load_image(graphics.FILES[color])
+
+        if color not in self.tiles:
+            shade = TILES.get(color)
+            if shade is None:
+                code = zlib.crc32(str(color).encode())
+                shade = (64 + code % 192, 64 + (code >> 8) % 192, 64 + (code >> 16) % 192)
+
+            tile = pygame.Surface((50, 50), pygame.SRCALPHA)
+            pygame.draw.rect(tile, shade, pygame.Rect(5, 5, 40, 40), border_radius=8)
+            self.tiles[color] = tile.convert_alpha()
+
+        return self.tiles[color]
+
+    def frame(self, grid, score, turn):
+        '''
+        Draw one frame of a game
+
+        Inputs:
+            grid (list of lists): grid[i][j] is the color at (i, j)
+            score (int): the score so far
+            turn (int): the number of turns played so far
+
+        Returns:
+            surface (Surface): the drawn frame
+        '''
+        surface = self.background.copy()
+
+        # Draw the jewels where the GUI would
+        for i in range(self.width):
+            for j in range(self.height):
+                image = self.image(grid[i][j])
+                rect = image.get_rect()
+                rect.center = (24 + 50 * i, 24 + 50 * j)
+                surface.blit(image, rect)
+
+        # Display the score at the bottom left and the turn at the bottom right
+        score_text = self.font.render("Score: " + str(score), True, (250, 250, 250))
+        score_rect = score_text.get_rect()
+        score_rect.top = 5 + 50 * self.height
+        surface.blit(score_text, score_rect)
+
+        turn_text = self.font.render("Turn: " + str(turn), True, (250, 250, 250))
+        turn_rect = turn_text.get_rect()
+        turn_rect.top = 5 + 50 * self.height
+        turn_rect.right = 50 * self.width - 25
+        surface.blit(turn_text, turn_rect)
+
+        return surface
+
+    def sheet(self, frames, columns=5, scale=0.5):
+        '''
+        Tile the frames of a game into one contact sheet
+
+        Inputs:
+            frames (list of Surfaces): the frames, in order
+            columns (int, optional): the number of frames in each row of the sheet
+            scale (float, optional): how much to shrink each frame
+
+        Returns:
+            surface (Surface): the contact sheet
+        '''
+        width = int(self.dimensions[0] * scale)
+        height = int(self.dimensions[1] * scale)
+        rows = (len(frames) + columns - 1) // columns
+
+        # Leave a gap around every frame so that they are easy to tell apart
+        gap = 4
+        surface = pygame.Surface(((width + gap) * min(columns, len(frames)) + gap,
+                                  (height + gap) * rows + gap)).convert()
+        surface.fill((40, 40, 40))
+
+        for k, frame in enumerate(frames):
+            surface.blit(pygame.transform.smoothscale(frame, (width, height)),
+                         (gap + (width + gap) * (k % columns), gap + (height + gap) * (k // columns)))
+
+        return surface
+
+
+def replay(record):
+    '''
+    Play a recorded game again. The board draws from its own stream of the game's
+    seed, so the same moves give the same boards as when the game was played
+
+    Inputs:
+        record (dict): a record written by runner.py, with its "moves"
+
+    Yields:
+        grid (list of lists): grid[i][j] is the color at (i, j), before the first turn
+            and after every turn
+        score (int): the score at that point
+    '''
+    engine = record.get("engine", "framework")
+
+    # The board's generator is the first drawn from the game's seed, as in runner.game()
+    streams = random.Random(record["seed"])
+    board = ENGINES[engine](colors=record["colors"], rng=random.Random(streams.getrandbits(64)),
+                            width=record.get("width", record["size"]),
+                            height=record.get("height", record["size"]))
+
+    def grid():
+        # The NumPy engine stores color indices instead of colors
+        return [[board.colors[item] if engine == "vectorized" else item for item in column]
+                for column in board.grid]
+
+    yield grid(), board.score
+    for pos1, pos2 in record["moves"]:
+        board.swap(tuple(pos1), tuple(pos2))
+        yield grid(), board.score
+
+
+def encode(task):
+    '''
+    Save one image in a worker process
+
+    Inputs:
+        task (tuple): the path to save to, the pixels as RGB bytes, and the dimensions
+
+    Returns:
+        path (str): the path saved to
+    '''
+    path, pixels, dimensions = task
+    pygame.image.save(pygame.image.frombuffer(pixels, dimensions, "RGB"), path)
+    return path
+
+
+def draw(records, out, sheet=False, columns=5, scale=0.5):
+    '''
+    Draw every recorded game
+
+    Inputs:
+        records (iterable of dicts): the records written by runner.py
+        out (str): the directory to save images in
+        sheet (bool, optional): if True, save one contact sheet per game. If False,
+            save one frame per turn
+        columns (int, optional): the number of frames in each row of a contact sheet
+        scale (float, optional): how much to shrink each frame in a contact sheet
+
+    Yields:
+        task (tuple): the path to save to, the pixels as RGB bytes, and the dimensions
+    '''
+    renderers = {}
+
+    for record in records:
+        shape = record.get("width", record["size"]), record.get("height", record["size"])
+        if shape not in renderers:
+            renderers[shape] = Renderer(*shape)
+        renderer = renderers[shape]
+
+        name = "game{}".format(record.get("game", record["seed"]))
+        frames = [renderer.frame(grid, score, turn) for turn, (grid, score) in enumerate(replay(record))]
+
+        if sheet:
+            images = [(os.path.join(out, name + ".png"), renderer.sheet(frames, columns, scale))]
+        else:
+            images = [(os.path.join(out, "{}_turn{:03d}.png".format(name, turn)), frame)
+                      for turn, frame in enumerate(frames)]
+
+        for path, image in images:
+            yield path, pygame.image.tostring(image, "RGB"), image.get_size()
+
+
+def main(argv=None):
+    '''
+    Parse the command line, replay the recorded games, and save their images
+
+    Inputs:
+        argv (list of strings, optional): the command line arguments. Defaults to sys.argv
+
+    Returns:
+        None
+    '''
+    parser = argparse.ArgumentParser(description="Render recorded games to images")
+    parser.add_argument("records", help="a file of JSON records written by runner.py")
+    parser.add_argument("--out", default="frames", help="directory to save images in")
+    parser.add_argument("--sheet", action="store_true", help="save one contact sheet per game")
+    parser.add_argument("--columns", type=int, default=5, help="frames per row of a contact sheet")
+    parser.add_argument("--scale", type=float, default=0.5, help="frame scale in a contact sheet")
+    parser.add_argument("--workers", type=int, default=None, help="defaults to the number of CPUs")
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.out, exist_ok=True)
+
+    with open(args.records) as f:
+        records = (json.loads(line) for line in f if line.strip())
+        tasks = draw(records, args.out, args.sheet, args.columns, args.scale)
+
+        # Encode images on the pool while the next ones are drawn
+        with multiprocessing.Pool(args.workers) as pool:
+            count = sum(1 for path in pool.imap_unordered(encode, tasks, chunksize=4))
+
+    print("saved {} images to {}".format(count, args.out), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
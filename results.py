@@ -0,0 +1,236 @@
+'''
+Tools for keeping the results of very long simulation runs. Records are appended
+to a file one JSON line at a time and flushed as they arrive, so a run that
+crashes keeps every game it finished. Summary statistics are updated one value at
+a time in constant memory, so nothing needs to be kept in lists until the end.
+'''
+import json
+import math
+import os
+
+
+class Sink:
+    '''
+    An append-only file of JSON records, one per line
+    '''
+    def __init__(self, path, sync=False):
+        '''
+        Open the file for appending, creating it if needed
+
+        Inputs:
+            path (str): the path of the file
+            sync (bool, optional): if True, make the operating system write every record
+                to disk before going on. Slower, but nothing is lost if the machine fails
+
+        Returns:
+            None
+        '''
+        self.file = open(path, "a")
+        self.sync = sync
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def write(self, record):
+        '''
+        Append a record to the file
+
+        Inputs:
+            record (dict): the record to write
+
+        Returns:
+            None
+        '''
+        self.file.write(json.dumps(record) + "\n")
+        self.file.flush()
+        if self.sync:
+            os.fsync(self.file.fileno())
+
+    def close(self):
+        '''
+        Close the file
+
+        Inputs:
+            None
+
+        Returns:
+            None
+        '''
+        self.file.close()
+
+
+class Quantile:
+    '''
+    An estimate of one quantile of a stream of values, kept with five markers using the
+    P-squared algorithm of Jain and Chlamtac, so it needs constant memory
+    '''
+    def __init__(self, p):
+        '''
+        Initialize the estimate with no values
+
+        Inputs:
+            p (float): the quantile to estimate, between 0 and 1
+
+        Returns:
+            None
+        '''
+        self.p = p
+
+        # The heights and positions of the markers, where they should be, and how far
+        # they should move for every new value
+        self.heights = []
+        self.positions = [1, 2, 3, 4, 5]
+        self.desired = [1, 1 + 2 * p, 1 + 4 * p, 3 + 2 * p, 5]
+        self.increments = [0, p / 2, p, (1 + p) / 2, 1]
+
+    def add(self, x):
+        '''
+        Add a value to the stream
+
+        Inputs:
+            x (float): the value
+
+        Returns:
+            None
+        '''
+        q = self.heights
+        n = self.positions
+
+        # The first five values are the starting markers
+        if len(q) < 5:
+            q.append(x)
+            q.sort()
+            return
+
+        # Find the cell the value falls in, stretching the ends if needed
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = 0
+            while x >= q[k + 1]:
+                k += 1
+
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self.desired[i] += self.increments[i]
+
+        # Move the middle markers toward where they should be
+        for i in range(1, 4):
+            d = self.desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+
+                # Try a parabolic step, and fall back to a linear one
+                height = q[i] + d / (n[i + 1] - n[i - 1]) * (
+                    (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+                    + (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1]))
+                if not q[i - 1] < height < q[i + 1]:
+                    height = q[i] + d * (q[i + d] - q[i]) / (n[i + d] - n[i])
+
+                q[i] = height
+                n[i] += d
+
+    def value(self):
+        '''
+        The current estimate of the quantile
+
+        Inputs:
+            None
+
+        Returns:
+            value (float): the estimate, or None if there are no values yet
+        '''
+        if not self.heights:
+            return None
+
+        # With fewer than five values, the markers are the sorted values themselves
+        if len(self.heights) < 5:
+            return self.heights[min(int(self.p * len(self.heights)), len(self.heights) - 1)]
+
+        return self.heights[2]
+
+
+class RunningStats:
+    '''
+    The count, mean, variance, extremes, and some quantiles of a stream of values,
+    updated one value at a time (the mean and variance with Welford's method)
+    '''
+    def __init__(self, quantiles=(0.05, 0.5, 0.95)):
+        '''
+        Initialize with no values
+
+        Inputs:
+            quantiles (tuple of floats, optional): the quantiles to estimate
+
+        Returns:
+            None
+        '''
+        self.count = 0
+        self.mean = 0.0
+        self.squares = 0.0
+        self.min = None
+        self.max = None
+        self.quantiles = [Quantile(p) for p in quantiles]
+
+    def add(self, x):
+        '''
+        Add a value to the stream
+
+        Inputs:
+            x (float): the value
+
+        Returns:
+            None
+        '''
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self.squares += delta * (x - self.mean)
+
+        self.min = x if self.min is None else min(self.min, x)
+        self.max = x if self.max is None else max(self.max, x)
+
+        for quantile in self.quantiles:
+            quantile.add(x)
+
+    def variance(self):
+        '''
+        The sample variance of the values so far
+
+        Inputs:
+            None
+
+        Returns:
+            variance (float): the variance, or 0 with fewer than two values
+        '''
+        return self.squares / (self.count - 1) if self.count > 1 else 0.0
+
+    def summary(self):
+        '''
+        Summarize the values so far in a form that can be written as JSON
+
+        Inputs:
+            None
+
+        Returns:
+            summary (dict): the count, mean, standard deviation, standard error of the
+                mean, extremes, and quantiles
+        '''
+        std = math.sqrt(self.variance())
+        return {
+            "count": self.count,
+            "mean": self.mean,
+            "std": std,
+            "sem": std / math.sqrt(self.count) if self.count else 0.0,
+            "min": self.min,
+            "max": self.max,
+            "quantiles": {str(quantile.p): quantile.value() for quantile in self.quantiles},
+        }
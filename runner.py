@@ -0,0 +1,299 @@
+'''
+Plays many games with one of the solvers, spread across a pool of worker processes.
+Every game is given its own seed, derived from the seed of the run, so any run (or
+any single game in it) can be reproduced exactly. The mcts solver is the exception
+when it searches for a time rather than a number of iterations (--iterations), since
+how far it gets depends on the speed of the machine.
+
+Run this file from the command line to print one JSON record per game, e.g.
+    python3 runner.py --solver empirical --loops 20 --games 1000 --workers 32
+'''
+import sys
+import json
+import time
+import random
+import argparse
+import multiprocessing
+
+import framework
+import bitboard
+from instrument import Stats
+from results import Sink, RunningStats
+from gamelog import Game, Writer, board_seed
+from solvers import brute_force, empirical, expectimax, MCTS
+
+
+# The solvers that can be selected by name
+SOLVERS = ["brute force", "empirical", "expectimax", "mcts"]
+
+# The board engines that can be selected by name
+ENGINES = {"framework": framework.Board, "bitboard": bitboard.Board}
+
+# The NumPy engine is only available if NumPy is installed
+try:
+    import vectorized
+    ENGINES["vectorized"] = vectorized.Board
+except ImportError:
+    pass
+
+
+def make_solver(solver="brute force", loops=1, depth=2, seconds=0.1, rng=None, common=False,
+                iterations=None):
+    '''
+    Build a solver function that takes a board and returns the pair to swap
+
+    Inputs:
+        solver (str): the solver method to use - one of SOLVERS
+        loops (int): if using "empirical", the number of loops to run
+        depth (int): if using "expectimax", the number of swaps to look ahead
+        seconds (float): if using "mcts", the time to search for each move
+        rng (random.Random, optional): the random number generator for the solver's
+            simulated playthroughs. Defaults to the board's own generator
+        common (bool): if using "empirical", whether to use common random numbers
+        iterations (int, optional): if using "mcts", the number of iterations to search for
+            each move instead of a time, so that the moves depend only on the seed
+
+    Returns:
+        solve (function): the solver
+    '''
+    if solver == "brute force":
+        return brute_force
+    elif solver == "empirical":
+        return lambda board: empirical(board, loops, rng=rng, common=common)
+    elif solver == "expectimax":
+        return lambda board: expectimax(board, depth, rng=rng)
+    elif solver == "mcts":
+        # A new search tree for every game. A fixed number of iterations takes the clock
+        # out of the search, so the same seed always gives the same moves
+        if iterations is not None:
+            return MCTS(seconds=None, iterations=iterations, rng=rng)
+        return MCTS(seconds=seconds, rng=rng)
+
+    raise ValueError("Unknown solver: " + str(solver))
+
+
+def game(turns=10, solver="brute force", loops=1, size=5, colors=["r", "g", "b", "y"], seed=None,
+         depth=2, seconds=0.1, common=False, engine="framework", instrument=False, width=None,
+         height=None, iterations=None):
+    '''
+    A function that will automatically play a game using one of the solver algorithms
+
+    Inputs:
+        turns (int): the number of rounds to play
+        solver (str): the solver method to use - one of SOLVERS
+        loops (int): if using "empirical", the number of loops to run
+        size (int): a dimension of the square board
+        colors (list of strings): the colors with which to populate the board
+        seed (int, optional): the seed from which the board's and the solver's random
+            number generators are drawn
+        depth (int, optional): if using "expectimax", the number of swaps to look ahead
+        seconds (float, optional): if using "mcts", the time to search for each move
+        common (bool, optional): if using "empirical", whether to use common random numbers
+        engine (str, optional): the board engine to use - one of ENGINES
+        instrument (bool, optional): whether to count and time the phases of the game.
+            Only the framework engine can be instrumented
+        width (int, optional): the number of columns, for boards that are not square.
+            Defaults to size
+        height (int, optional): the number of rows, for boards that are not square.
+            Defaults to size
+        iterations (int, optional): if using "mcts", the number of iterations to search for
+            each move instead of a time. Games are only reproducible with a fixed number
+
+    Returns:
+        record (dict): the parameters of the game, its final score, the score after
+            every turn, the swap made every turn, and the time taken in seconds, plus a
+            summary of the counters and timers if instrumented
+    '''
+    start = time.perf_counter()
+    width = width if width is not None else size
+    height = height if height is not None else size
+
+    # The board and the solver draw from separate streams, so the board's refills do
+    # not depend on how many numbers the solver used
+    streams = random.Random(seed)
+
+    # Initialize a board and the solver
+    if instrument:
+        if engine != "framework":
+            raise ValueError("Only the framework engine can be instrumented")
+        stats = Stats()
+        board = framework.Board(colors=colors, rng=random.Random(streams.getrandbits(64)), stats=stats,
+                                width=width, height=height)
+    else:
+        board = ENGINES[engine](colors=colors, rng=random.Random(streams.getrandbits(64)),
+                                width=width, height=height)
+    solve = make_solver(solver, loops=loops, depth=depth, seconds=seconds, iterations=iterations,
+                        rng=random.Random(streams.getrandbits(64)), common=common)
+
+    # Every turn, pick a pair to swap based on the solver method
+    scores = []
+    moves = []
+    for i in range(turns):
+        if instrument:
+            # Keep how many swaps the solver tried and how long it took on this turn
+            probes = stats.counts.get("probes", 0)
+            with stats.timer("solver"):
+                pair = solve(board)
+            stats.sample("probes per turn", stats.counts.get("probes", 0) - probes)
+        else:
+            pair = solve(board)
+
+        board.swap(pair[0], pair[1])
+        scores.append(board.score)
+        moves.append(pair)
+
+    record = {
+        "seed": seed,
+        "solver": solver,
+        "loops": loops,
+        "depth": depth,
+        "seconds": seconds,
+        "iterations": iterations,
+        "common": common,
+        "engine": engine,
+        "turns": turns,
+        "size": size,
+        "width": width,
+        "height": height,
+        "colors": colors,
+        "score": board.score,
+        "scores": scores,
+        "moves": moves,
+        "time": time.perf_counter() - start,
+    }
+
+    if instrument:
+        record["stats"] = stats.summary()
+
+    return record
+
+
+def play(task):
+    '''
+    Play one game in a worker process
+
+    Inputs:
+        task (tuple): the index of the game and the keyword arguments for game()
+
+    Returns:
+        record (dict): the record from game(), with the index of the game added
+    '''
+    index, params = task
+    record = game(**params)
+    record["game"] = index
+    return record
+
+
+def run(games, workers=None, seed=0, **params):
+    '''
+    Play many games across a pool of worker processes, yielding each record as soon
+    as its game finishes. Records may arrive out of order; each has a "game" index
+
+    Inputs:
+        games (int): the number of games to play
+        workers (int, optional): the number of worker processes. Defaults to the
+            number of CPUs, and 1 plays every game in this process
+        seed (int, optional): the seed from which every game's seed is drawn
+        **params: the remaining keyword arguments for game()
+
+    Yields:
+        record (dict): the record of each game
+    '''
+    # Draw every game's seed in order so that results do not depend on scheduling. The
+    # tasks are made as the pool takes them, so memory stays flat for any number of games
+    rng = random.Random(seed)
+    tasks = ((k, dict(params, seed=rng.getrandbits(64))) for k in range(games))
+
+    if workers == 1:
+        for task in tasks:
+            yield play(task)
+        return
+
+    # Hand out games in small chunks so that records stream back steadily
+    chunksize = max(1, games // (8 * (workers or multiprocessing.cpu_count())))
+
+    with multiprocessing.Pool(workers) as pool:
+        yield from pool.imap_unordered(play, tasks, chunksize=chunksize)
+
+
+def main(argv=None):
+    '''
+    Parse the command line, run the games, and write one JSON record per line. Records
+    are appended to the output file as each game finishes, and summary statistics of the
+    scores and times are kept as they arrive
+
+    Inputs:
+        argv (list of strings, optional): the command line arguments. Defaults to sys.argv
+
+    Returns:
+        None
+    '''
+    parser = argparse.ArgumentParser(description="Play many games with a solver in parallel")
+    parser.add_argument("--solver", choices=SOLVERS, default="brute force")
+    parser.add_argument("--loops", type=int, default=1, help="loops for the empirical solver")
+    parser.add_argument("--common", action="store_true",
+                        help="use common random numbers in the empirical solver")
+    parser.add_argument("--depth", type=int, default=2, help="lookahead for the expectimax solver")
+    parser.add_argument("--seconds", type=float, default=0.1,
+                        help="time per move for the mcts solver (not reproducible)")
+    parser.add_argument("--iterations", type=int, default=None,
+                        help="iterations per move for the mcts solver, instead of --seconds")
+    parser.add_argument("--engine", choices=sorted(ENGINES), default="framework")
+    parser.add_argument("--instrument", action="store_true",
+                        help="add counters and timers for the phases of each game to its record")
+    parser.add_argument("--games", type=int, default=1000)
+    parser.add_argument("--turns", type=int, default=10)
+    parser.add_argument("--size", type=int, default=5)
+    parser.add_argument("--width", type=int, default=None, help="columns, if not square (default: size)")
+    parser.add_argument("--height", type=int, default=None, help="rows, if not square (default: size)")
+    parser.add_argument("--colors", default="rgby", help="one character per color")
+    parser.add_argument("--workers", type=int, default=None, help="defaults to the number of CPUs")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=None, help="file to append records to (default: stdout)")
+    parser.add_argument("--log", default=None,
+                        help="binary game log to append the seed and swaps of every game to")
+    parser.add_argument("--sync", action="store_true",
+                        help="make sure every record is on disk before going on")
+    args = parser.parse_args(argv)
+
+    out = Sink(args.out, sync=args.sync) if args.out else None
+    log = Writer(args.log) if args.log else None
+
+    scores = RunningStats()
+    times = RunningStats()
+    try:
+        for record in run(args.games, workers=args.workers, seed=args.seed,
+                          turns=args.turns, solver=args.solver, loops=args.loops, depth=args.depth,
+                          seconds=args.seconds, iterations=args.iterations, common=args.common,
+                          engine=args.engine, instrument=args.instrument,
+                          size=args.size, width=args.width, height=args.height,
+                          colors=list(args.colors)):
+            if out is not None:
+                out.write(record)
+            else:
+                print(json.dumps(record), flush=True)
+
+            if log is not None:
+                log.write(Game(record["size"], record["colors"], board_seed(record["seed"]),
+                               record["moves"], record["engine"], record["width"], record["height"]))
+
+            scores.add(record["score"])
+            times.add(record["time"])
+    finally:
+        if out is not None:
+            out.close()
+        if log is not None:
+            log.close()
+
+    # Report the statistics on stderr so they do not mix with the records
+    if scores.count:
+        summary = scores.summary()
+        print("games: {}, mean score: {:.3f} (std {:.3f}, sem {:.3f}), "
+              "median {:.1f}, 5%-95% {:.1f} to {:.1f}, mean time {:.4f} s".format(
+                  summary["count"], summary["mean"], summary["std"], summary["sem"],
+                  summary["quantiles"]["0.5"], summary["quantiles"]["0.05"],
+                  summary["quantiles"]["0.95"], times.mean), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
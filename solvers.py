@@ -1,11 +1,18 @@
 '''
 Several different possible solving algorithms for any given board state
 '''
-import copy
+import math
+import time
+import random
+import contextlib
+import multiprocessing
+import concurrent.futures
+from multiprocessing import shared_memory
+
 from framework import *
 
 
-def brute_force(board):
+def brute_force(board, cache=None):
     '''
     This method will test every possible swap on the board (with no playthrough,
     i.e., only considering the results of the swap itself) and return the pair
@@ -13,63 +20,49 @@ def brute_force(board):
 
     Inputs:
         board (Board): the board in the state to be tested
+        cache (TranspositionCache, optional): a cache of the scores of each swap,
+            keyed on the hash of the board. Without one, boards with a best_move()
+            keep the scores up to date themselves
 
     Returns:
         pair (tuple): the pair of coordinates with the highest score
     '''
-    # Store the state of the grid when the function is run
-    starting_grid = copy.deepcopy(board.grid)
-    starting_score = board.score
+    if cache is None and hasattr(board, "best_move"):
+        return board.best_move()
 
-    # Initialize outputs
-    pair = ((),())
-    highest = 0
+    key = ("brute force", board.width, board.height, tuple(board.colors), board.hash)
 
-    # Try swapping every element in the j direction:
-    for i in range(board.size):
-        for j in range(board.size - 1):
-            board.swap2_no_replacement((i, j), (i, j + 1))
+    # Look for the scores of this board in the cache before testing any swaps
+    scores = cache.get(key) if cache is not None else None
+    if scores is None:
+        scores = {}
 
-            # If the score increases, a match was made
-            if board.score > starting_score:
-
-                # If this yields a higher score than the current highest,
-                # update the outputs accordingly
-                if board.score - starting_score > highest:
-                    highest = board.score - starting_score
-                    pair = ((i, j), (i, j + 1))
-
-                # Clear the board and reset the score
-                board.grid = copy.deepcopy(starting_grid)
-                board.score = starting_score
-                continue
+        # Try every swap that makes a match
+        for pos1, pos2 in board.legal_moves():
+            journal = board.apply_swap(pos1, pos2, refill=False)
+            scores[(pos1, pos2)] = journal.points
 
             # Restore the board and continue
-            board.grid = copy.deepcopy(starting_grid)
-            board.score = starting_score
-
-    # Repeat in the i direction
-    for i in range(board.size - 1):
-        for j in range(board.size):
-            board.swap2_no_replacement((i, j), (i + 1, j))
+            board.undo(journal)
 
-            if board.score > starting_score:
+        if cache is not None:
+            cache.put(key, scores)
 
-                if board.score - starting_score > highest:
-                    highest = board.score - starting_score
-                    pair = ((i, j), (i + 1, j))
-
-                board.grid = copy.deepcopy(starting_grid)
-                board.score = starting_score
-                continue
+    # Initialize outputs
+    pair = ((),())
+    highest = 0
 
-            board.grid = copy.deepcopy(starting_grid)
-            board.score = starting_score
+    for swap, points in scores.items():
+        # If this yields a higher score than the current highest,
+        # update the outputs accordingly
+        if points > highest:
+            highest = points
+            pair = swap
 
     # Return the highest pair
     return pair
 
-def empirical(board, loops=1):
+def empirical(board, loops=1, pool=None, cache=None, rng=None, common=False):
     '''
     This method will try every swap on the board with simulated playthrough.
     The optional loops parameter allows this to be done many times, selecting
@@ -78,61 +71,697 @@ def empirical(board, loops=1):
     Inputs:
         board (Board): the current board state
         loops (int): the number of times to simulate playthrough
+        pool (RolloutPool, optional): a pool of worker processes to share the loops
+        cache (TranspositionCache, optional): a cache of the pair frequencies,
+            keyed on the hash of the board and the number of loops
+        rng (random.Random, optional): the random number generator for the simulated
+            refills. Defaults to the board's own generator
+        common (bool, optional): if True, every swap in a loop sees the same sequence
+            of refills (common random numbers), so swaps are compared on equal terms
+            and fewer loops are needed for a stable choice
 
     Returns:
         pair (tuple): the highest scoring pair over the given number of loops
     '''
+    key = ("empirical", loops, common, board.width, board.height, tuple(board.colors),
+           board.hash)
+
     # Store the pair frequencies in a dictionary
+    frequencies = cache.get(key) if cache is not None else None
+    if frequencies is None:
+        if pool is not None:
+            frequencies = pool.tally(board, loops, rng, common)
+        else:
+            frequencies = tally(board, loops, rng, common)
+
+        if cache is not None:
+            cache.put(key, frequencies)
+
+    # Return the dictionary item with the most tallies
+    return max(frequencies, key=frequencies.get)
+
+def expectimax(board, depth=2, samples=4, width=6, cap=20, rng=None):
+    '''
+    This method looks several swaps ahead. The random pieces that refill the board
+    after a swap are treated as chance: each swap is played through a number of times
+    and its value is the average of the points scored plus the value of the best
+    swap that follows. On the last swap looked at, pieces are not refilled, as in
+    brute_force. Swaps are tried in order of the points they score on their own, and
+    a swap stops being sampled once it looks unable to beat the best swap found so far
+
+    The default depth of 2 is the one meant for interactive play, at about 50 ms a
+    move on a 7x7 board. Depth 3 takes one to a few seconds a move on the same board,
+    which suits batch runs rather than play
+
+    Inputs:
+        board (Board): the current board state
+        depth (int): the number of swaps to look ahead. A depth of 1 is brute_force
+        samples (int): the number of playthroughs of each swap
+        width (int): the number of swaps to look at after the first one, taking
+            those that score the most on their own
+        cap (int): the most points a single turn is assumed to be worth. Cascades have
+            no real limit, so this is a guess: a swap that would have scored more can
+            be cut off and the best swap missed. Higher values prune less and miss less
+        rng (random.Random, optional): the random number generator for the simulated
+            refills. Defaults to the board's own generator
+
+    Returns:
+        pair (tuple): the pair with the highest expected score
+    '''
+    moves = ordered(board)
+
+    # Looking one swap ahead is the same as brute force
+    if depth == 1:
+        return moves[0][1] if moves else ((),())
+
+    # Initialize outputs
+    pair = ((),())
+    highest = -1
+
+    # Every swap is looked at on the first turn
+    with refills(board, rng):
+        for points, swap in moves:
+            value = expect(board, swap, depth, samples, width, cap, highest)
+
+            if value > highest:
+                highest = value
+                pair = swap
+
+    return pair
+
+def ordered(board):
+    '''
+    Score every swap that makes a match on its own (without playthrough) and sort
+    them from highest to lowest, keeping the usual order for ties
+
+    Inputs:
+        board (Board): the current board state
+
+    Returns:
+        moves (list): a list of (points, pair) tuples
+    '''
+    moves = []
+    for pos1, pos2 in board.legal_moves():
+        journal = board.apply_swap(pos1, pos2, refill=False)
+        moves.append((journal.points, (pos1, pos2)))
+        board.undo(journal)
+
+    moves.sort(key=lambda move: -move[0])
+    return moves
+
+def maximize(board, depth, samples, width, cap):
+    '''
+    Find the value of the best swap on the board for the expectimax method
+
+    Inputs:
+        board (Board): the current board state
+        depth (int): the number of swaps to look ahead
+        samples (int): the number of playthroughs of each swap
+        width (int): the number of swaps to look at
+        cap (int): the most points a single turn is assumed to be worth
+
+    Returns:
+        value (float): the expected value of the best swap
+    '''
+    moves = ordered(board)
+
+    # With no swaps left, the turn is worth nothing
+    if not moves:
+        return 0
+
+    # On the last swap, use the score without playthrough
+    if depth == 1:
+        return moves[0][0]
+
+    highest = 0
+    for points, swap in moves[:width]:
+        highest = max(highest, expect(board, swap, depth, samples, width, cap, highest))
+
+    return highest
+
+def expect(board, pair, depth, samples, width, cap, alpha):
+    '''
+    Estimate the value of a swap for the expectimax method by averaging over several
+    playthroughs. Sampling stops early if the swap cannot beat alpha even when every
+    remaining playthrough scores the cap on every turn
+
+    Inputs:
+        board (Board): the current board state
+        pair (tuple): the pair to swap
+        depth (int): the number of swaps to look ahead, including this one
+        samples (int): the number of playthroughs of the swap
+        width (int): the number of swaps to look at on later turns
+        cap (int): the most points a single turn is assumed to be worth
+        alpha (float): the value the swap must beat
+
+    Returns:
+        value (float): the average value of the swap, or an upper bound no higher
+            than alpha if sampling stopped early
+    '''
+    total = 0
+
+    for k in range(samples):
+        journal = board.apply_swap(pair[0], pair[1])
+        total += journal.points + maximize(board, depth - 1, samples, width, cap)
+        board.undo(journal)
+
+        # Stop if even the best possible remaining playthroughs cannot beat alpha
+        bound = (total + (samples - k - 1) * depth * cap) / samples
+        if bound <= alpha:
+            return bound
+
+    return total / samples
+
+def tally(board, loops, rng=None, common=False):
+    '''
+    Simulate playthrough of every swap the given number of times, counting how often
+    each pair is the highest scorer
+
+    Inputs:
+        board (Board): the current board state
+        loops (int): the number of times to simulate playthrough
+        rng (random.Random, optional): the random number generator for the simulated
+            refills. Defaults to the board's own generator
+        common (bool, optional): if True, every swap in a loop sees the same refills
+
+    Returns:
+        frequencies (dict): the number of loops in which each pair scored the highest
+    '''
     frequencies = {}
 
-    for i in range(loops):
-        # Store the state of the grid when the function is run
-        starting_grid = copy.deepcopy(board.grid)
-        starting_score = board.score
+    # Only swaps that make a match can score, and the board is the same every loop
+    moves = board.legal_moves()
+
+    with refills(board, rng) as stream:
+        for i in range(loops):
+            # Initialize outputs
+            pair = ((),())
+            highest = 0
 
-        # Initialize outputs
-        pair = ((),())
-        highest = 0
+            # With common random numbers, every swap restarts the same stream
+            if common:
+                seed = stream.getrandbits(64)
 
-        # Try swapping every element in the j direction:
-        for i in range(board.size):
-            for j in range(board.size - 1):
-                board.swap2((i, j), (i, j + 1))
+            # Try every swap that makes a match
+            for pos1, pos2 in moves:
+                if common:
+                    board.rng = random.Random(seed)
+
+                journal = board.apply_swap(pos1, pos2)
 
                 # If the score increases, a match was made
-                if board.score > starting_score:
-                    if board.score - starting_score > highest:
-                        highest = board.score - starting_score
-                        pair = ((i, j), (i, j + 1))
-                    board.grid = copy.deepcopy(starting_grid)
-                    board.score = starting_score
-                    continue
+                if journal.points > highest:
+                    highest = journal.points
+                    pair = (pos1, pos2)
 
                 # Restore the board and continue
-                board.grid = copy.deepcopy(starting_grid)
-                board.score = starting_score
-
-        # Repeat in the i direction
-        for i in range(board.size - 1):
-            for j in range(board.size):
-                board.swap2((i, j), (i + 1, j))
-
-                if board.score > starting_score:
-                    if board.score - starting_score > highest:
-                        highest = board.score - starting_score
-                        pair = ((i, j), (i + 1, j))
-                    board.grid = copy.deepcopy(starting_grid)
-                    board.score = starting_score
-                    continue
-
-                board.grid = copy.deepcopy(starting_grid)
-                board.score = starting_score
-
-        # Increment the frequency of the pair
-        if pair in frequencies:
-            frequencies[pair] += 1
+                board.undo(journal)
+
+            # Increment the frequency of the pair
+            if pair in frequencies:
+                frequencies[pair] += 1
+            else:
+                frequencies[pair] = 1
+
+    return frequencies
+
+@contextlib.contextmanager
+def refills(board, rng):
+    '''
+    Refill the board from the given random number generator for the length of a
+    with block, so that simulated playthroughs do not draw from the board's own stream
+
+    Inputs:
+        board (Board): the board to refill
+        rng (random.Random): the random number generator to use, or None to keep
+            the board's own generator
+
+    Yields:
+        rng (random.Random): the generator in use
+    '''
+    saved = board.rng
+    board.rng = rng if rng is not None else saved
+    try:
+        yield board.rng
+    finally:
+        board.rng = saved
+
+def rollouts(engine, name, width, height, colors, loops, seed, common=False):
+    '''
+    Run some of the loops of the empirical method in a worker process, reading the
+    board from shared memory. The board is rebuilt with the same engine as the one
+    the loops were asked for, so the rollouts play by the same code
+
+    Inputs:
+        engine (type): the Board class of the board
+        name (str): the name of the shared memory block holding the board
+        width (int): the number of columns of the board
+        height (int): the number of rows of the board
+        colors (list of strings): the colors of the board
+        loops (int): the number of times to simulate playthrough
+        seed (int): the seed for this worker's random number generator
+        common (bool, optional): if True, every swap in a loop sees the same refills
+
+    Returns:
+        frequencies (dict): the number of loops in which each pair scored the highest
+    '''
+    block = shared_memory.SharedMemory(name=name)
+    try:
+        codes = bytes(block.buf[:width * height])
+    finally:
+        block.close()
+
+    # Rebuild the board from the color of every item
+    grid = [[colors[codes[i * height + j]] for j in range(height)] for i in range(width)]
+    board = engine(colors=colors, grid=grid, rng=random.Random(seed), width=width, height=height)
+
+    return tally(board, loops, common=common)
+
+
+class RolloutPool:
+    '''
+    A pool of worker processes that share the loops of the empirical method. Each call
+    writes the board to shared memory once, rather than sending it with every task, and
+    the frequencies counted by each worker are added together at the end
+    '''
+    def __init__(self, workers=None):
+        '''
+        Start the worker processes
+
+        Inputs:
+            workers (int, optional): the number of worker processes. Defaults to the
+                number of CPUs
+
+        Returns:
+            None
+        '''
+        self.workers = workers or multiprocessing.cpu_count()
+        self.executor = concurrent.futures.ProcessPoolExecutor(self.workers)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def tally(self, board, loops, rng=None, common=False):
+        '''
+        Split the loops across the workers and combine their frequencies
+
+        Inputs:
+            board (Board): the current board state
+            loops (int): the number of times to simulate playthrough
+            rng (random.Random, optional): the random number generator from which the
+                workers' seeds are drawn. Defaults to the board's own generator
+            common (bool, optional): if True, every swap in a loop sees the same refills
+
+        Returns:
+            frequencies (dict): the number of loops in which each pair scored the highest
+        '''
+        return self.submit(board, loops, rng, common).frequencies()
+
+    def submit(self, board, loops, rng=None, common=False):
+        '''
+        Start splitting the loops across the workers without waiting for them, so that
+        the caller can go on and collect the frequencies later
+
+        Inputs:
+            board (Board): the current board state
+            loops (int): the number of times to simulate playthrough
+            rng (random.Random, optional): the random number generator from which the
+                workers' seeds are drawn. Defaults to the board's own generator
+            common (bool, optional): if True, every swap in a loop sees the same refills
+
+        Returns:
+            job (RolloutJob): the loops being played
+        '''
+        rng = rng if rng is not None else board.rng
+
+        # Store the index of each item's color, column by column. The grid is read once,
+        # since some engines build it on every access, and the NumPy engine's grid
+        # already holds the indices
+        grid = board.grid
+        if hasattr(grid, "tobytes"):
+            codes = grid.astype("uint8").tobytes()
         else:
-            frequencies[pair] = 1
+            index = {color: k for k, color in enumerate(board.colors)}
+            codes = bytes(index[item] for column in grid for item in column)
 
-    # Return the dictionary item with the most tallies
-    return max(frequencies, key=frequencies.get)
+        block = shared_memory.SharedMemory(create=True, size=len(codes))
+        block.buf[:len(codes)] = codes
+
+        # Give each worker an even share of the loops and its own seed
+        shares = [loops // self.workers + (k < loops % self.workers) for k in range(self.workers)]
+        try:
+            futures = [self.executor.submit(rollouts, type(board), block.name, board.width,
+                                            board.height, board.colors, share,
+                                            rng.getrandbits(64), common)
+                       for share in shares if share]
+        except BaseException:
+            block.close()
+            block.unlink()
+            raise
+
+        return RolloutJob(block, futures)
+
+    def close(self):
+        '''
+        Shut down the worker processes
+
+        Inputs:
+            None
+
+        Returns:
+            None
+        '''
+        self.executor.shutdown()
+
+
+class RolloutJob:
+    '''
+    The loops of one call to RolloutPool.submit(), as they are played by the workers
+    '''
+    def __init__(self, block, futures):
+        '''
+        Keep track of the workers' tasks
+
+        Inputs:
+            block (SharedMemory): the shared memory holding the board
+            futures (list of Futures): the task of each worker
+
+        Returns:
+            None
+        '''
+        self.block = block
+        self.futures = futures
+
+    def done(self):
+        '''
+        Check whether every worker has finished. Never waits
+
+        Inputs:
+            None
+
+        Returns:
+            bool: True if the frequencies are ready
+        '''
+        return all(future.done() for future in self.futures)
+
+    def frequencies(self):
+        '''
+        Wait for the workers and add up their frequencies. An error in any worker is
+        raised here
+
+        Inputs:
+            None
+
+        Returns:
+            frequencies (dict): the number of loops in which each pair scored the highest
+        '''
+        try:
+            frequencies = {}
+            for future in self.futures:
+                for pair, count in future.result().items():
+                    frequencies[pair] = frequencies.get(pair, 0) + count
+        finally:
+            self.release()
+
+        return frequencies
+
+    def cancel(self):
+        '''
+        Drop the tasks that have not started and stop waiting for the rest
+
+        Inputs:
+            None
+
+        Returns:
+            None
+        '''
+        for future in self.futures:
+            future.cancel()
+        self.release()
+
+    def release(self):
+        '''
+        Free the shared memory, once
+
+        Inputs:
+            None
+
+        Returns:
+            None
+        '''
+        if self.block is not None:
+            self.block.close()
+            self.block.unlink()
+            self.block = None
+
+
+class MCTS:
+    '''
+    A Monte Carlo tree search solver. Each iteration plays a few turns ahead from the
+    current board, choosing swaps in the tree with the UCB1 rule so that playthroughs
+    go to the most promising swaps, then finishing with random swaps. The search runs
+    until a time or iteration budget is used up, and the best swap found so far is
+    always available. Because the refills are random, each swap in the tree leads to
+    one node for every board it has been seen to produce, identified by the board's hash.
+
+    An MCTS object is called like the other solvers, solver(board) -> pair. It keeps
+    its tree between calls, so if the next board is one that the played swap was
+    already seen to produce, the search continues from that part of the tree
+    '''
+    def __init__(self, seconds=0.1, iterations=None, horizon=3, exploration=1.4, rng=None):
+        '''
+        Initialize the solver with an empty tree
+
+        Inputs:
+            seconds (float, optional): the longest time to search for each move, or None
+                for no limit
+            iterations (int, optional): the most iterations to run for each move, or None
+                for no limit
+            horizon (int, optional): the number of turns each iteration plays ahead
+            exploration (float, optional): the weight of the exploration term in UCB1
+            rng (random.Random, optional): the random number generator for the simulated
+                refills and random swaps. Defaults to the board's own generator
+
+        Returns:
+            None
+        '''
+        self.rng = rng
+        self.seconds = seconds
+        self.iterations = iterations
+        self.horizon = horizon
+        self.exploration = exploration
+
+        self.root = None
+        self.played = None
+
+    def __call__(self, board):
+        '''
+        Search from the given board until the budget is used up and return the best swap
+
+        Inputs:
+            board (Board): the current board state
+
+        Returns:
+            pair (tuple): the swap that was tried the most
+        '''
+        self.reroot(board)
+
+        deadline = None if self.seconds is None else time.perf_counter() + self.seconds
+        count = 0
+
+        # Always run at least one iteration so that there is a move to return
+        with refills(board, self.rng):
+            while True:
+                self.iterate(board)
+                count += 1
+
+                if self.iterations is not None and count >= self.iterations:
+                    break
+                if deadline is not None and time.perf_counter() >= deadline:
+                    break
+
+        self.played = self.best()
+        return self.played
+
+    def reroot(self, board):
+        '''
+        Move the root of the tree to the node for the given board, keeping the search
+        done below it, or start a new tree if the board has not been seen
+
+        Inputs:
+            board (Board): the current board state
+
+        Returns:
+            None
+        '''
+        # The board might not have changed, for example after a useless swap
+        if self.root is not None and self.root.hash == board.hash:
+            return
+
+        # Look for the board among the results of the swap that was played
+        if self.root is not None and self.played in self.root.children:
+            node = self.root.children[self.played].outcomes.get(board.hash)
+            if node is not None:
+                self.root = node
+                return
+
+        self.root = Decision(board)
+
+    def best(self):
+        '''
+        The best swap found so far: the one tried the most from the root
+
+        Inputs:
+            None
+
+        Returns:
+            pair (tuple): the best pair, or ((), ()) if no swap has been tried
+        '''
+        if not self.root.children:
+            return ((),())
+
+        return max(self.root.children, key=lambda pair: self.root.children[pair].visits)
+
+    def iterate(self, board):
+        '''
+        Run one iteration of the search: select swaps down the tree, add one new node,
+        finish with random swaps, and record the points scored along the way. The board
+        is restored afterwards
+
+        Inputs:
+            board (Board): the board at the root of the tree
+
+        Returns:
+            None
+        '''
+        journals = []
+        path = []
+        node = self.root
+
+        # Select swaps with UCB1 until a new node is reached or the horizon is met
+        for turn in range(self.horizon):
+            pair = node.select(self.exploration)
+            if pair is None:
+                break
+
+            journal = board.apply_swap(pair[0], pair[1])
+            journals.append(journal)
+
+            action = node.children[pair]
+            path.append((action, journal.points))
+
+            # Find the node for the board this swap produced, adding it if it is new
+            child = action.outcomes.get(board.hash)
+            if child is None:
+                action.outcomes[board.hash] = Decision(board)
+                break
+            node = child
+
+        # Finish the horizon with random swaps
+        rollout = 0
+        for turn in range(self.horizon - len(journals)):
+            moves = board.legal_moves()
+            if not moves:
+                break
+
+            journal = board.apply_swap(*board.rng.choice(moves))
+            journals.append(journal)
+            rollout += journal.points
+
+        # Record the points scored after each swap in the tree
+        value = rollout
+        for action, points in reversed(path):
+            value += points
+            action.visits += 1
+            action.total += value
+
+        for journal in reversed(journals):
+            board.undo(journal)
+
+
+class Decision:
+    '''
+    A node of the MCTS tree where a swap is chosen
+    '''
+    def __init__(self, board):
+        '''
+        Initialize the node for a board, with every swap that makes a match untried
+
+        Inputs:
+            board (Board): the board at this node
+
+        Returns:
+            None
+        '''
+        self.hash = board.hash
+
+        # Try the swaps that score the most on their own first
+        self.untried = [pair for points, pair in reversed(ordered(board))]
+        self.children = {}
+
+    def select(self, exploration):
+        '''
+        Choose the next swap to try from this node, preferring untried swaps and then
+        the one with the highest UCB1 score
+
+        Inputs:
+            exploration (float): the weight of the exploration term
+
+        Returns:
+            pair (tuple): the chosen pair, or None if there are no swaps
+        '''
+        if self.untried:
+            pair = self.untried.pop()
+            self.children[pair] = Action()
+            return pair
+
+        if not self.children:
+            return None
+
+        # Scale the averages so the exploration weight does not depend on typical scores
+        visits = sum(action.visits for action in self.children.values())
+        scale = max(action.total / action.visits for action in self.children.values()) or 1
+
+        return max(self.children, key=lambda pair: self.children[pair].ucb(visits, scale, exploration))
+
+
+class Action:
+    '''
+    A node of the MCTS tree for a swap, whose results depend on the random refills
+    '''
+    def __init__(self):
+        '''
+        Initialize the node with no results
+
+        Inputs:
+            None
+
+        Returns:
+            None
+        '''
+        self.visits = 0
+        self.total = 0
+
+        # The decision node for each board this swap has produced, keyed by hash
+        self.outcomes = {}
+
+    def ucb(self, parent_visits, scale, exploration):
+        '''
+        The UCB1 score of the swap
+
+        Inputs:
+            parent_visits (int): the number of times a swap was chosen at the parent
+            scale (float): the value by which to divide the average points
+            exploration (float): the weight of the exploration term
+
+        Returns:
+            score (float): the UCB1 score
+        '''
+        if not self.visits:
+            return float("inf")
+
+        return (self.total / self.visits / scale
+                + exploration * math.sqrt(math.log(parent_visits) / self.visits))
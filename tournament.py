@@ -0,0 +1,318 @@
+'''
+Compares solvers head to head. Every solver plays the same games: the seed of a
+game decides its starting board and the stream of new pieces, so two solvers'
+scores on one seed differ only by the swaps they chose. For each pair of solvers
+the differences are tracked with a confidence sequence, which can be looked at
+after every game, so a pairing stops as soon as the better solver is known at the
+chosen confidence. The guarantee is exact when --sigma bounds the spread of the
+differences; by default the spread is estimated as the games come in, which makes
+the guarantee approximate, most of all over the first few dozen games. Games stop
+when every pairing is settled or the budget runs out, which usually takes far
+fewer games than a fixed run of each solver.
+
+Run this file from the command line with the solvers to compare, e.g.
+    python3 tournament.py --solvers "brute force" empirical-5 empirical-20 --workers 8
+'''
+import math
+import random
+import argparse
+import itertools
+import multiprocessing
+
+from runner import ENGINES, game
+from results import Sink, RunningStats
+
+
+# The solvers that can be entered by name, with their keyword arguments for runner.game()
+SOLVERS = {
+    "brute force": {"solver": "brute force"},
+    "empirical-5": {"solver": "empirical", "loops": 5},
+    "empirical-20": {"solver": "empirical", "loops": 20},
+    "empirical-50": {"solver": "empirical", "loops": 50},
+    "expectimax-2": {"solver": "expectimax", "depth": 2},
+    "mcts": {"solver": "mcts"},
+}
+
+
+def register(name, **params):
+    '''
+    Add a solver that can be entered by name
+
+    Inputs:
+        name (str): the name to enter it by
+        **params: its keyword arguments for runner.game(), e.g. solver="empirical", loops=10
+
+    Returns:
+        None
+    '''
+    SOLVERS[name] = params
+
+
+def radius(count, std, alpha, optimum=100):
+    '''
+    A helper function that finds how far the mean of paired differences can be from
+    the true mean, using the normal mixture confidence sequence of Robbins. Unlike a
+    fixed-sample interval it holds at every count at once, so the mean can be checked
+    after every game and the comparison stopped as soon as it is settled. This only
+    holds for a known standard deviation, or a bound on it; an estimate makes the
+    interval approximate
+
+    Inputs:
+        count (int): the number of differences
+        std (float): the standard deviation of the differences, or a bound on it
+        alpha (float): the chance that the true mean is ever outside the bound
+        optimum (int, optional): the number of games at which the bound is tightest
+
+    Returns:
+        radius (float): the half-width of the interval around the mean
+    '''
+    return std * math.sqrt((count + optimum) * (math.log((count + optimum) / optimum)
+                                                + 2 * math.log(1 / alpha))) / count
+
+
+class Pairing:
+    '''
+    The paired differences between the scores of two solvers
+    '''
+    def __init__(self, first, second, sigma=None, floor=1.0):
+        '''
+        Start a pairing with no games
+
+        Inputs:
+            first (str): the name of one solver
+            second (str): the name of the other solver
+            sigma (float, optional): a bound on the standard deviation of the differences,
+                which makes the interval exact. By default it is estimated from the
+                differences, and the interval is only approximate
+            floor (float, optional): the smallest estimate of the standard deviation to
+                use, so that a run of equal differences does not settle the pairing at
+                once. Scores are whole points, so the default is one point
+
+        Returns:
+            None
+        '''
+        self.first = first
+        self.second = second
+        self.sigma = sigma
+        self.floor = floor
+        self.differences = RunningStats(quantiles=())
+        self.winner = None
+
+    def add(self, scores):
+        '''
+        Add the difference of the two solvers' scores on one game
+
+        Inputs:
+            scores (dict): the score of every solver on the game, by name
+
+        Returns:
+            None
+        '''
+        self.differences.add(scores[self.first] - scores[self.second])
+
+    def radius(self, alpha, optimum=100):
+        '''
+        The half-width of the confidence interval around the mean difference
+
+        Inputs:
+            alpha (float): the chance that the true mean is ever outside the interval
+            optimum (int, optional): the number of games at which it is tightest
+
+        Returns:
+            radius (float): the half-width, or infinity with fewer than two games
+        '''
+        if self.differences.count < 2:
+            return math.inf
+
+        if self.sigma is not None:
+            std = self.sigma
+        else:
+            std = max(math.sqrt(self.differences.variance()), self.floor)
+        return radius(self.differences.count, std, alpha, optimum)
+
+    def settle(self, alpha, min_games=10, optimum=100):
+        '''
+        Decide the winner once the interval no longer holds 0
+
+        Inputs:
+            alpha (float): the chance that the true mean is ever outside the interval
+            min_games (int, optional): the fewest games before deciding, so that the
+                standard deviation is not estimated from too few
+            optimum (int, optional): the number of games at which the interval is tightest
+
+        Returns:
+            settled (bool): whether the pairing has a winner
+        '''
+        if self.winner is None and self.differences.count >= min_games:
+            if abs(self.differences.mean) > self.radius(alpha, optimum):
+                self.winner = self.first if self.differences.mean > 0 else self.second
+        return self.winner is not None
+
+
+def play(task):
+    '''
+    Play one game of the tournament in a worker process
+
+    Inputs:
+        task (tuple): the index of the game, the name of the solver, and the keyword
+            arguments for runner.game()
+
+    Returns:
+        record (dict): the record from runner.game(), with the index of the game and
+            the name of the solver added
+    '''
+    index, name, params = task
+    record = game(**params)
+    record["game"] = index
+    record["entrant"] = name
+    return record
+
+
+def tournament(names, alpha=0.05, max_games=1000, batch=None, workers=None, seed=0,
+               min_games=10, optimum=100, sigma=None, **params):
+    '''
+    Play the solvers against each other on the same games until every pairing is
+    settled or the budget of games runs out. The confidence is split evenly between
+    the pairings, so all of them are right together with chance 1 - alpha (exactly if
+    sigma is given, and approximately if it is estimated)
+
+    Inputs:
+        names (list of strings): the solvers to enter - keys of SOLVERS
+        alpha (float, optional): the chance of any pairing being decided wrongly
+        max_games (int, optional): the most games for any solver
+        batch (int, optional): the number of games played between checks. Defaults to
+            the number of workers
+        workers (int, optional): the number of worker processes. Defaults to the
+            number of CPUs, and 1 plays every game in this process
+        seed (int, optional): the seed from which every game's seed is drawn
+        min_games (int, optional): the fewest games before a pairing is decided
+        optimum (int, optional): the number of games at which the intervals are tightest
+        sigma (float, optional): a bound on the standard deviation of the differences in
+            score, which makes the intervals exact. Estimated from the games by default
+        **params: the remaining keyword arguments for runner.game(), shared by every solver
+
+    Yields:
+        record (dict): the record of each game, in order
+        pairings (list of Pairings): every pairing, kept up to date as games are played
+    '''
+    pairings = [Pairing(first, second, sigma)
+                for first, second in itertools.combinations(names, 2)]
+    share = alpha / max(1, len(pairings))
+    batch = batch or workers or multiprocessing.cpu_count()
+
+    # Every solver gets the same seed for the same game, as in runner.run()
+    rng = random.Random(seed)
+    pool = multiprocessing.Pool(workers) if workers != 1 else None
+
+    try:
+        played = 0
+        while played < max_games:
+            # Only solvers in an unsettled pairing need to keep playing
+            open_pairings = [pairing for pairing in pairings if pairing.winner is None]
+            if not open_pairings:
+                break
+            entrants = [name for name in names
+                        if any(name in (pairing.first, pairing.second) for pairing in open_pairings)]
+
+            count = min(batch, max_games - played)
+            tasks = [(played + k, name, dict(params, seed=seed_k, **SOLVERS[name]))
+                     for k, seed_k in enumerate(rng.getrandbits(64) for k in range(count))
+                     for name in entrants]
+            records = pool.imap(play, tasks) if pool is not None else map(play, tasks)
+
+            # Pair up the scores game by game, in order
+            for k in range(count):
+                scores = {}
+                for name in entrants:
+                    record = next(records)
+                    scores[name] = record["score"]
+                    yield record, pairings
+
+                for pairing in open_pairings:
+                    pairing.add(scores)
+
+            played += count
+
+            # Checking after every batch is fine, since the intervals hold at every count
+            for pairing in open_pairings:
+                pairing.settle(share, min_games, optimum)
+    finally:
+        if pool is not None:
+            pool.terminate()
+
+
+def main(argv=None):
+    '''
+    Parse the command line, run the tournament, and report every pairing
+
+    Inputs:
+        argv (list of strings, optional): the command line arguments. Defaults to sys.argv
+
+    Returns:
+        None
+    '''
+    parser = argparse.ArgumentParser(description="Compare solvers on the same games")
+    parser.add_argument("--solvers", nargs="+", choices=sorted(SOLVERS),
+                        default=["brute force", "empirical-5", "empirical-20"])
+    parser.add_argument("--alpha", type=float, default=0.05,
+                        help="chance of deciding any pairing wrongly")
+    parser.add_argument("--max-games", type=int, default=1000, help="the most games for any solver")
+    parser.add_argument("--min-games", type=int, default=10, help="the fewest games before deciding")
+    parser.add_argument("--sigma", type=float, default=None,
+                        help="a bound on the standard deviation of the differences in score, "
+                             "which makes the confidence exact (default: estimated)")
+    parser.add_argument("--batch", type=int, default=None,
+                        help="games between checks (default: workers)")
+    parser.add_argument("--common", action="store_true",
+                        help="use common random numbers in the empirical solvers")
+    parser.add_argument("--iterations", type=int, default=200,
+                        help="iterations per move for the mcts solver, which searches for a "
+                             "fixed number rather than a time so that games stay paired")
+    parser.add_argument("--engine", choices=sorted(ENGINES), default="framework")
+    parser.add_argument("--turns", type=int, default=10)
+    parser.add_argument("--size", type=int, default=5)
+    parser.add_argument("--width", type=int, default=None, help="columns, if not square (default: size)")
+    parser.add_argument("--height", type=int, default=None, help="rows, if not square (default: size)")
+    parser.add_argument("--colors", default="rgby", help="one character per color")
+    parser.add_argument("--workers", type=int, default=None, help="defaults to the number of CPUs")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=None, help="file to append the record of every game to")
+    args = parser.parse_args(argv)
+
+    out = Sink(args.out) if args.out else None
+
+    scores = {name: RunningStats(quantiles=()) for name in args.solvers}
+    pairings = []
+    try:
+        for record, pairings in tournament(args.solvers, alpha=args.alpha, max_games=args.max_games,
+                                           batch=args.batch, workers=args.workers, seed=args.seed,
+                                           min_games=args.min_games, sigma=args.sigma,
+                                           turns=args.turns,
+                                           common=args.common, iterations=args.iterations,
+                                           engine=args.engine, size=args.size,
+                                           width=args.width, height=args.height,
+                                           colors=list(args.colors)):
+            if out is not None:
+                out.write(record)
+            scores[record["entrant"]].add(record["score"])
+    finally:
+        if out is not None:
+            out.close()
+
+    # Rank the solvers by their mean score, then report each pairing
+    share = args.alpha / max(1, len(pairings))
+    for name in sorted(scores, key=lambda name: -scores[name].mean):
+        print("{}: {} games, mean score {:.3f}".format(name, scores[name].count, scores[name].mean))
+
+    for pairing in pairings:
+        if pairing.winner is not None:
+            verdict = pairing.winner + " is better"
+        else:
+            verdict = "not settled"
+        print("{} - {}: {:+.3f} +/- {:.3f} after {} games, {}".format(
+            pairing.first, pairing.second, pairing.differences.mean,
+            pairing.radius(share), pairing.differences.count, verdict))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,694 @@
+'''
+A NumPy-backed version of the board from framework.py. The grid is stored as a
+small integer array (each entry is an index into the list of colors) so that
+every horizontal and vertical group can be found in one vectorized pass.
+
+The Board class here has the same interface as framework.Board, so it can be
+used by the solvers and simulations in place of the list-based version. The
+Environment class plays a whole batch of games at once for fast simulation.
+'''
+
+import random
+import numpy as np
+
+
+# Offsets (di, dj) for a jewel moving one step right, left, down, or up
+DIRECTIONS = [(1, 0), (-1, 0), (0, 1), (0, -1)]
+
+# Width of the padding used when looking up neighbors around a move
+PAD = 3
+
+
+class Board:
+    '''
+    A board stored as a 2D NumPy array of color indices. As in framework.py,
+    boards are defined by the convention self.grid[i][j], where directions are:
+     → i
+    ↓
+    j
+    (indexed starting at 0)
+
+    After initializing, boards can swap items and check for matches
+    '''
+    def __init__(self, size=5, colors=["r", "g", "b", "y"], rng=None, width=None, height=None,
+                 grid=None):
+        '''
+        Initialize the board by randomly populating it and then clearing any matches
+        that may appear
+
+        Inputs:
+            size (int, optional): a dimension of the square board
+            colors (list of strings, optional): the colors with which to populate the board
+            rng (random.Random, optional): the random number generator for populating,
+                refilling, and shuffling the board. Defaults to the random module
+            width (int, optional): the number of columns, for boards that are not square.
+                Defaults to size
+            height (int, optional): the number of rows, for boards that are not square.
+                Defaults to size
+            grid (list of lists, optional): a starting grid of colors to copy instead of
+                populating the board randomly
+
+        Returns:
+            None
+        '''
+        # Initialize parameters
+        self.width = width if width is not None else size
+        self.height = height if height is not None else size
+        self.size = self.width if self.width == self.height else None
+        self.colors = colors
+        self.score = 0
+        self.rng = rng if rng is not None else random
+
+        # Populate the board randomly with color indices, unless a starting grid is given
+        if grid is None:
+            self.grid = np.array(self.rng.choices(range(len(colors)), k=self.width * self.height),
+                                 dtype=np.int8).reshape(self.width, self.height)
+        else:
+            index = {color: k for k, color in enumerate(colors)}
+            self.grid = np.array([[index[item] for item in column] for column in grid],
+                                 dtype=np.int8)
+
+        # Clear matches and reset the score
+        self.match()
+        self.score = 0
+
+        # If no matches exist, shuffle until they do
+        while not self.matches_exist():
+            self.shuffle()
+            self.score = 0
+
+    def __repr__(self):
+        '''
+        A string representation of the board which outputs it as a grid with the current score
+
+        Inputs:
+            None
+
+        Returns:
+            None
+        '''
+        for i in range(self.height):
+            row = ""
+            for j in range(self.width):
+                row += str(self.colors[self.grid[j][i]]) + " "
+            print(row)
+        return "Score: " + str(self.score)
+
+    @property
+    def hash(self):
+        '''
+        A hash of the board, equal for boards with the same items in the same places
+
+        Inputs:
+            None
+
+        Returns:
+            value (int): the hash of the grid
+        '''
+        return hash(self.grid.tobytes())
+
+    def match(self):
+        '''
+        Finds every group on the board, scores them, and refills the board until
+        no groups remain
+
+        Inputs:
+            None
+
+        Returns:
+            None
+        '''
+        # Run until all matches are cleared because more might show up as the pieces shift
+        while True:
+            points, cleared = find_matches(self.grid)
+
+            # Stop the loop if no matches were found
+            if not points:
+                break
+
+            self.score += int(points)
+            self.collapse(cleared)
+
+    def match_no_replacement(self):
+        '''
+        The same as the match function, but does not clear or refill the board in
+        order to facilitate the solver functions
+
+        Inputs:
+            None
+
+        Returns:
+            None
+        '''
+        self.score += int(find_matches(self.grid)[0])
+
+    def collapse(self, cleared):
+        '''
+        Removes the cleared items, lets the remaining items in each column fall,
+        and refills the columns from the top with random pieces
+
+        Inputs:
+            cleared (array): a boolean array the shape of the grid marking the items to remove
+
+        Returns:
+            None
+        '''
+        # A stable sort on the kept flag moves the cleared items to the top of each
+        # column while keeping the remaining items in their original order
+        order = np.argsort(~cleared, axis=1, kind="stable")
+        self.grid = np.take_along_axis(self.grid, order, axis=1)
+
+        # The first n items of a column with n cleared items are refilled
+        counts = cleared.sum(axis=1)
+        refill = np.arange(self.height)[np.newaxis, :] < counts[:, np.newaxis]
+        self.grid[refill] = self.rng.choices(range(len(self.colors)), k=int(counts.sum()))
+
+    def swap(self, pos1, pos2):
+        '''
+        Swap two items in the grid and check for matches
+
+        Inputs:
+            pos1 (tuple): the coordinate of the first item to swap
+            pos1 (tuple): the coordinate of the second item to swap
+
+        Returns:
+            None
+        '''
+        # Remember the starting score
+        starting_score = self.score
+
+        # Swap the items
+        item1 = self.grid[pos1[0]][pos1[1]]
+        item2 = self.grid[pos2[0]][pos2[1]]
+
+        self.grid[pos1[0]][pos1[1]] = item2
+        self.grid[pos2[0]][pos2[1]] = item1
+
+        # Check for matches
+        self.match()
+
+        # If the swap was useless, swap them back
+        if self.score == starting_score:
+            self.grid[pos1[0]][pos1[1]] = item1
+            self.grid[pos2[0]][pos2[1]] = item2
+
+        # If the swap was valid
+        else:
+            # If no matches exist, shuffle until they do
+            while not self.matches_exist():
+                self.shuffle()
+
+    def swap2(self, pos1, pos2):
+        '''
+        Swap two items in the grid and check for matches. This version of the function does NOT use
+        the matches_exist() function in order to avoid infinite looping
+
+        Inputs:
+            pos1 (tuple): the coordinate of the first item to swap
+            pos1 (tuple): the coordinate of the second item to swap
+
+        Returns:
+            None
+        '''
+        item1 = self.grid[pos1[0]][pos1[1]]
+        item2 = self.grid[pos2[0]][pos2[1]]
+
+        self.grid[pos1[0]][pos1[1]] = item2
+        self.grid[pos2[0]][pos2[1]] = item1
+
+        self.match()
+
+    def swap2_no_replacement(self, pos1, pos2):
+        '''
+        Swap two items in the grid and score the matches without clearing them. This version of
+        the function does NOT use the matches_exist() function in order to avoid infinite looping
+
+        Inputs:
+            pos1 (tuple): the coordinate of the first item to swap
+            pos1 (tuple): the coordinate of the second item to swap
+
+        Returns:
+            None
+        '''
+        item1 = self.grid[pos1[0]][pos1[1]]
+        item2 = self.grid[pos2[0]][pos2[1]]
+
+        self.grid[pos1[0]][pos1[1]] = item2
+        self.grid[pos2[0]][pos2[1]] = item1
+
+        self.match_no_replacement()
+
+    def apply_swap(self, pos1, pos2, refill=True):
+        '''
+        Swap two items in the grid and score the result, keeping what is needed to reverse
+        it with undo(). Unlike swap(), a useless swap is not swapped back
+
+        Inputs:
+            pos1 (tuple): the coordinate of the first item to swap
+            pos2 (tuple): the coordinate of the second item to swap
+            refill (bool, optional): if True, clear and refill matches with full playthrough
+                (like swap2). If False, only score the matches made by the swap itself
+                (like swap2_no_replacement)
+
+        Returns:
+            snapshot (Snapshot): the record of the changes, including the points scored
+        '''
+        starting_score = self.score
+
+        # The grid is small, so keeping a copy is cheaper than recording each change
+        snapshot = Snapshot(pos1, pos2, self.grid.copy() if refill else None)
+
+        if refill:
+            self.swap2(pos1, pos2)
+        else:
+            self.swap2_no_replacement(pos1, pos2)
+
+        snapshot.points = self.score - starting_score
+        return snapshot
+
+    def undo(self, snapshot):
+        '''
+        Restore the board to exactly the state it was in before apply_swap() was called
+
+        Inputs:
+            snapshot (Snapshot): the record returned by apply_swap()
+
+        Returns:
+            None
+        '''
+        if snapshot.grid is not None:
+            self.grid = snapshot.grid
+        else:
+            # Only the swap itself changed the grid
+            pos1, pos2 = snapshot.pos1, snapshot.pos2
+            item1 = self.grid[pos1[0]][pos1[1]]
+            item2 = self.grid[pos2[0]][pos2[1]]
+
+            self.grid[pos1[0]][pos1[1]] = item2
+            self.grid[pos2[0]][pos2[1]] = item1
+
+        self.score -= snapshot.points
+
+    def shuffle(self):
+        '''
+        Randomly shuffle the items on the board and check for matches.
+
+        Inputs:
+            None
+
+        Returns:
+            None
+        '''
+        items = self.grid.flatten().tolist()
+        self.rng.shuffle(items)
+        self.grid = np.array(items, dtype=np.int8).reshape(self.width, self.height)
+
+        # Clear any matches that show up
+        self.match()
+
+    def matches_exist(self):
+        '''
+        Determines if any matches are possible. The board is not modified.
+
+        Inputs:
+            None
+
+        Returns:
+            bool: True if matches are possible, False if not
+        '''
+        return self.has_legal_move()
+
+    def legal_moves(self):
+        '''
+        Lists every swap that would make a match, in the same order that the solvers
+        try them. The board is not modified.
+
+        Inputs:
+            None
+
+        Returns:
+            moves (list): a list of ((i1, j1), (i2, j2)) pairs
+        '''
+        moves = movable(self.grid)
+
+        # A swap makes a match if either item makes a match in its new square
+        down = moves[DIRECTIONS.index((0, 1))][:, :-1] | moves[DIRECTIONS.index((0, -1))][:, 1:]
+        right = moves[DIRECTIONS.index((1, 0))][:-1, :] | moves[DIRECTIONS.index((-1, 0))][1:, :]
+
+        pairs = [((int(i), int(j)), (int(i), int(j) + 1)) for i, j in np.argwhere(down)]
+        pairs += [((int(i), int(j)), (int(i) + 1, int(j))) for i, j in np.argwhere(right)]
+        return pairs
+
+    def has_legal_move(self):
+        '''
+        Checks the neighborhood of every item to determine if any swap would make
+        a match. The board is not modified.
+
+        Inputs:
+            None
+
+        Returns:
+            bool: True if a swap would make a match, False if not
+        '''
+        return bool(movable(self.grid).any())
+
+
+class Snapshot:
+    '''
+    A record of a swap made by Board.apply_swap(), which Board.undo() uses to restore
+    the board
+    '''
+    def __init__(self, pos1, pos2, grid=None):
+        '''
+        Start a record of a swap
+
+        Inputs:
+            pos1 (tuple): the coordinate of the first item swapped
+            pos2 (tuple): the coordinate of the second item swapped
+            grid (array, optional): a copy of the grid before the swap, if the swap
+                might change more than the two swapped items
+
+        Returns:
+            None
+        '''
+        self.pos1 = pos1
+        self.pos2 = pos2
+        self.grid = grid
+
+        # The points scored by the swap and any cascades it caused
+        self.points = 0
+
+
+def find_runs(grid, axis):
+    '''
+    Marks every item that is part of a group of three or more along one axis. The
+    last two axes of the grid are the board, so a stack of boards can be passed at once
+
+    Inputs:
+        grid (array): an array of color indices whose last two axes are (i, j)
+        axis (int): -1 for groups within a column (vertical), -2 for groups within a row
+
+    Returns:
+        in_run (array): a boolean array marking the items in a group
+        starts (array): the number of separate groups found on each board
+    '''
+    # Work along the last axis so both directions share the same slicing
+    g = np.moveaxis(grid, axis, -1)
+
+    # An item starts a triple when it matches the next two items
+    triple = (g[..., :-2] == g[..., 1:-1]) & (g[..., 1:-1] == g[..., 2:])
+
+    in_run = np.zeros(g.shape, dtype=bool)
+    in_run[..., :-2] |= triple
+    in_run[..., 1:-1] |= triple
+    in_run[..., 2:] |= triple
+
+    # A group starts where a marked item does not continue a group of the same color
+    start = in_run.copy()
+    start[..., 1:] &= ~in_run[..., :-1] | (g[..., 1:] != g[..., :-1])
+
+    return np.moveaxis(in_run, -1, axis), start.sum(axis=(-2, -1))
+
+
+def find_matches(grid):
+    '''
+    Scores every group on the board in one pass. Each group is worth 2 * length - 5
+    points, and each item shared by a vertical and a horizontal group is worth 2 more
+
+    Inputs:
+        grid (array): an array of color indices whose last two axes are (i, j)
+
+    Returns:
+        points (array): the score of every group on each board
+        cleared (array): a boolean array marking the items to remove
+    '''
+    vertical, vertical_groups = find_runs(grid, -1)
+    horizontal, horizontal_groups = find_runs(grid, -2)
+
+    points = (2 * vertical.sum(axis=(-2, -1)) - 5 * vertical_groups
+              + 2 * horizontal.sum(axis=(-2, -1)) - 5 * horizontal_groups
+              + 2 * (vertical & horizontal).sum(axis=(-2, -1)))
+
+    return points, vertical | horizontal
+
+
+def movable(grid):
+    '''
+    Finds every item that makes a match when moved one step in each direction, using
+    the 3-in-a-row templates around the square it moves into
+
+    Inputs:
+        grid (array): an array of color indices whose last two axes are (i, j)
+
+    Returns:
+        moves (array): a boolean array with a leading axis of length 4, where
+            moves[k][..., i, j] is True if moving the item at (i, j) by DIRECTIONS[k]
+            makes a match
+    '''
+    size_i, size_j = grid.shape[-2:]
+    padding = [(0, 0)] * (grid.ndim - 2) + [(PAD, PAD), (PAD, PAD)]
+    padded = np.pad(grid.astype(np.int16), padding, constant_values=-1)
+
+    def at(di, dj):
+        # The item at (i + di, j + dj) for every (i, j), or -1 off the board
+        return padded[..., PAD + di:PAD + di + size_i, PAD + dj:PAD + dj + size_j]
+
+    moves = np.zeros((len(DIRECTIONS),) + grid.shape, dtype=bool)
+    for k, (di, dj) in enumerate(DIRECTIONS):
+        # The two directions perpendicular to the move
+        pi, pj = dj, di
+
+        def same(a, b):
+            # Whether the item at offset (a, b) from the square moved into has the same color
+            return at(di + a, dj + b) == grid
+
+        # The square moved into must be on the board
+        moves[k] = (at(di, dj) >= 0) & (
+            (same(di, dj) & same(2 * di, 2 * dj))
+            | (same(pi, pj) & same(2 * pi, 2 * pj))
+            | (same(-pi, -pj) & same(-2 * pi, -2 * pj))
+            | (same(pi, pj) & same(-pi, -pj)))
+
+    return moves
+
+
+def candidate_swaps(width, height=None):
+    '''
+    Lists every pair of neighboring coordinates in the order used by the solvers:
+    first every swap in the j direction, then every swap in the i direction
+
+    Inputs:
+        width (int): the number of columns of the board
+        height (int, optional): the number of rows, for boards that are not square.
+            Defaults to width
+
+    Returns:
+        pairs (list): a list of ((i1, j1), (i2, j2)) tuples
+    '''
+    height = height if height is not None else width
+    pairs = [((i, j), (i, j + 1)) for i in range(width) for j in range(height - 1)]
+    pairs += [((i, j), (i + 1, j)) for i in range(width - 1) for j in range(height)]
+    return pairs
+
+
+class Environment:
+    '''
+    A batch of independent games played in lockstep. The boards are stored as one
+    array of shape (n, width, height), indexed as grids[k][i][j] for board k, and every
+    step of the game (swapping, clearing, refilling, scoring, and reshuffling dead
+    boards) runs across the whole batch at once. Games that run out of turns are
+    reset automatically.
+    '''
+    def __init__(self, n, size=5, colors=["r", "g", "b", "y"], turns=10, seed=None,
+                 width=None, height=None):
+        '''
+        Initialize the batch and deal a new board for every game
+
+        Inputs:
+            n (int): the number of games to play at once
+            size (int, optional): a dimension of each square board
+            colors (list of strings, optional): the colors with which to populate the boards
+            turns (int, optional): the number of turns in each game
+            seed (int, optional): a seed for the random number generator
+            width (int, optional): the number of columns, for boards that are not square.
+                Defaults to size
+            height (int, optional): the number of rows, for boards that are not square.
+                Defaults to size
+
+        Returns:
+            None
+        '''
+        # Initialize parameters
+        self.n = n
+        self.width = width if width is not None else size
+        self.height = height if height is not None else size
+        self.size = self.width if self.width == self.height else None
+        self.colors = colors
+        self.turns = turns
+        self.rng = np.random.default_rng(seed)
+
+        self.grids = np.zeros((n, self.width, self.height), dtype=np.int8)
+        self.scores = np.zeros(n, dtype=np.int64)
+        self.turn = np.zeros(n, dtype=np.int64)
+
+        self.pairs = candidate_swaps(self.width, self.height)
+
+        self.reset()
+
+    def reset(self, mask=None):
+        '''
+        Deal new boards, clear any matches on them, and make sure each one has a move
+
+        Inputs:
+            mask (array, optional): a boolean array selecting the games to reset.
+                Every game is reset by default
+
+        Returns:
+            grids (array): the boards of every game
+        '''
+        if mask is None:
+            mask = np.ones(self.n, dtype=bool)
+
+        count = int(mask.sum())
+        if count:
+            self.grids[mask] = self.rng.integers(len(self.colors), size=(count, self.width, self.height))
+            self.cascade(mask)
+            self.settle(mask)
+
+            # Points from setting up the board do not count
+            self.scores[mask] = 0
+            self.turn[mask] = 0
+
+        return self.grids
+
+    def cascade(self, mask):
+        '''
+        Clears and scores every group on the selected boards, letting pieces fall and
+        refilling from the top until no groups remain
+
+        Inputs:
+            mask (array): a boolean array selecting the games to update
+
+        Returns:
+            points (array): the points scored on each board
+        '''
+        points = np.zeros(self.n, dtype=np.int64)
+        active = np.flatnonzero(mask)
+
+        while active.size:
+            found, cleared = find_matches(self.grids[active])
+
+            # Only keep working on boards that still have groups
+            keep = found > 0
+            active, found, cleared = active[keep], found[keep], cleared[keep]
+            if not active.size:
+                break
+
+            points[active] += found
+
+            # Move the cleared items to the top of each column, keeping the rest in order
+            order = np.argsort(~cleared, axis=-1, kind="stable")
+            grids = np.take_along_axis(self.grids[active], order, axis=-1)
+
+            # Refill the cleared items with random pieces
+            counts = cleared.sum(axis=-1)
+            refill = np.arange(self.height) < counts[..., np.newaxis]
+            grids[refill] = self.rng.integers(len(self.colors), size=int(counts.sum()))
+
+            self.grids[active] = grids
+
+        self.scores += points
+        return points
+
+    def settle(self, mask):
+        '''
+        Shuffles the selected boards that have no possible moves until every one has a
+        move. Points from matches made by shuffling are scored, as in framework.Board.swap
+
+        Inputs:
+            mask (array): a boolean array selecting the games to check
+
+        Returns:
+            None
+        '''
+        while True:
+            dead = mask & ~movable(self.grids).any(axis=(0, 2, 3))
+            if not dead.any():
+                break
+
+            # Shuffle each dead board independently and clear any matches that show up
+            flat = self.grids[dead].reshape(-1, self.width * self.height)
+            self.grids[dead] = self.rng.permuted(flat, axis=1).reshape(-1, self.width, self.height)
+            self.cascade(dead)
+
+    def step(self, moves):
+        '''
+        Play one turn on every board. Each swap is scored with full playthrough, and a
+        swap that makes no match is swapped back but still uses up the turn
+
+        Inputs:
+            moves (array): an integer array of shape (n, 4) holding the swap
+                (i1, j1, i2, j2) for each game
+
+        Returns:
+            points (array): the points scored on each board this turn
+            done (array): a boolean array marking the games that just finished
+            scores (array): the score of each game before finished games were reset
+        '''
+        moves = np.asarray(moves)
+        boards = np.arange(self.n)
+        i1, j1, i2, j2 = moves.T
+
+        # Swap the items
+        item1 = self.grids[boards, i1, j1]
+        item2 = self.grids[boards, i2, j2]
+        self.grids[boards, i1, j1] = item2
+        self.grids[boards, i2, j2] = item1
+
+        # Check for matches
+        points = self.cascade(np.ones(self.n, dtype=bool))
+
+        # If the swap was useless, swap them back
+        useless = points == 0
+        self.grids[useless, i1[useless], j1[useless]] = item1[useless]
+        self.grids[useless, i2[useless], j2[useless]] = item2[useless]
+
+        # If the swap was valid, shuffle boards until they have a move
+        self.settle(~useless)
+
+        # Finish games that are out of turns and start new ones in their place
+        self.turn += 1
+        done = self.turn >= self.turns
+        scores = self.scores.copy()
+        self.reset(done)
+
+        return points, done, scores
+
+    def brute_force(self):
+        '''
+        The batched version of solvers.brute_force: for every board, find the swap
+        that scores the most points on its own (without playthrough)
+
+        Inputs:
+            None
+
+        Returns:
+            moves (array): an integer array of shape (n, 4) holding the best swap
+                (i1, j1, i2, j2) for each game
+        '''
+        best = np.zeros(self.n, dtype=np.int64)
+        choice = np.zeros(self.n, dtype=np.int64)
+        grids = self.grids.copy()
+
+        for k, ((i1, j1), (i2, j2)) in enumerate(self.pairs):
+            # Swap the pair on every board, score it, and swap it back
+            grids[:, [i1, i2], [j1, j2]] = grids[:, [i2, i1], [j2, j1]]
+            points = find_matches(grids)[0]
+            grids[:, [i1, i2], [j1, j2]] = grids[:, [i2, i1], [j2, j1]]
+
+            # Keep the first pair with the highest score, like solvers.brute_force
+            better = points > best
+            best[better] = points[better]
+            choice[better] = k
+
+        return np.array([p1 + p2 for p1, p2 in self.pairs])[choice]